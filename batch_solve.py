@@ -0,0 +1,246 @@
+import numpy as np
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+
+from duality_computation import disable_profiling, enable_profiling, solve_disk_intersection
+from out_of_core import open_centers, solve_disk_intersection_out_of_core
+from parallel_solver import solve_many
+from solution_cache import SolutionCache
+
+'''
+Headless batch driver: reads disk centers from a file (or stdin), solves each
+instance with solve_disk_intersection, and writes the resulting arcs
+
+Input formats:
+- CSV (or stdin): one center per row, either "x,y" for a single instance or
+  "instance,x,y" where consecutive rows with the same instance id form one instance.
+  A non-numeric header row is skipped
+- NPY: an array of shape (N, 2) for a single instance, or (N, 3) with the instance id
+  in the first column. The file is memory-mapped and read in blocks
+- Raw: native-endian float64 (x, y) pairs with no header, for a single instance
+Output formats:
+- CSV: rows "instance,x,y,r,theta0,theta1"
+- NPY: a float64 array of shape (M, 6) with the same columns
+The instance column of the output is the position of the instance in the input (0, 1, 2, ...)
+Instances are read, solved and written one at a time, so memory use is bounded
+by the largest single instance rather than the size of the file. A single NPY or
+raw instance too large for that can be solved out of core (see out_of_core.py)
+'''
+
+ARC_COLUMNS = ['instance', 'x', 'y', 'r', 'theta0', 'theta1']
+NPY_BLOCK_ROWS = 1 << 20
+
+###############################
+#######  Read instances  ######
+###############################
+
+'''
+Yields one (N, 2) array of centers per instance in the input
+Input:
+- source: path to a .csv, .npy or raw file, or '-' for CSV on stdin
+- input_format: 'csv', 'npy', 'raw', or None to infer from the file extension ('csv' unless .npy)
+'''
+def read_instances(source, input_format = None):
+    if input_format is None:
+        input_format = 'npy' if source.endswith('.npy') else 'csv'
+
+    if input_format == 'npy':
+        yield from _read_npy_instances(source)
+    elif input_format == 'raw':
+        yield np.array(open_centers(source, 'raw'))
+    elif source == '-':
+        yield from _read_csv_instances(sys.stdin)
+    else:
+        with open(source, newline = '') as f:
+            yield from _read_csv_instances(f)
+
+def _read_csv_instances(f):
+    current_id, centers = None, []
+    for row_num, row in enumerate(csv.reader(f)):
+        if len(row) == 0: continue
+        try:
+            values = [float(value) for value in row]
+        except ValueError:
+            if row_num == 0: continue   # Header row
+            raise
+
+        if len(values) == 2:
+            instance_id, x, y = None, values[0], values[1]
+        elif len(values) == 3:
+            instance_id, x, y = values
+        else:
+            raise ValueError('Expected 2 or 3 columns in row %d, found %d' % (row_num + 1, len(values)))
+
+        if instance_id != current_id and len(centers) > 0:
+            yield np.array(centers)
+            centers = []
+        current_id = instance_id
+        centers.append((x, y))
+
+    if len(centers) > 0:
+        yield np.array(centers)
+
+def _read_npy_instances(path):
+    data = np.load(path, mmap_mode = 'r')
+    if data.ndim != 2 or data.shape[1] not in (2, 3):
+        raise ValueError('Expected an array of shape (N, 2) or (N, 3), found %s' % (data.shape,))
+    if data.shape[1] == 2:
+        yield np.array(data, dtype = np.float64)
+        return
+
+    pieces = []
+    for start in range(0, len(data), NPY_BLOCK_ROWS):
+        block = np.array(data[start:start + NPY_BLOCK_ROWS], dtype = np.float64)
+        ids = block[:, 0]
+
+        # Rows where a new instance starts within this block (or continues from the last one)
+        starts = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        if len(pieces) > 0 and ids[0] != pieces[-1][-1, 0]:
+            starts = np.insert(starts, 0, 0)
+
+        prev = 0
+        for split in starts:
+            if split > prev: pieces.append(block[prev:split])
+            if len(pieces) > 0:
+                yield np.concatenate(pieces)[:, 1:]
+            pieces = []
+            prev = split
+        pieces.append(block[prev:])
+
+    if len(pieces) > 0:
+        yield np.concatenate(pieces)[:, 1:]
+
+###############################
+#######  Write results  #######
+###############################
+
+'''
+Writes arcs as CSV rows, one instance at a time
+'''
+class CSVArcWriter:
+    def __init__(self, f):
+        self._writer = csv.writer(f)
+        self._writer.writerow(ARC_COLUMNS)
+
+    def write(self, instance, arcs):
+        self._writer.writerows([instance, *arc] for arc in arcs)
+
+    def close(self):
+        pass
+
+'''
+Writes arcs to a .npy file, one instance at a time
+Rows are streamed to a temporary file, since the .npy header needs the total row count
+'''
+class NPYArcWriter:
+    def __init__(self, path):
+        self._path = path
+        self._rows = 0
+        self._tmp = tempfile.TemporaryFile(dir = os.path.dirname(os.path.abspath(path)))
+
+    def write(self, instance, arcs):
+        if len(arcs) == 0: return
+        rows = np.empty((len(arcs), len(ARC_COLUMNS)))
+        rows[:, 0] = instance
+        rows[:, 1:] = arcs
+        self._tmp.write(rows.tobytes())
+        self._rows += len(rows)
+
+    def close(self):
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.float64)),
+                  'fortran_order': False,
+                  'shape': (self._rows, len(ARC_COLUMNS))}
+        self._tmp.seek(0)
+        with open(self._path, 'wb') as f:
+            np.lib.format.write_array_header_1_0(f, header)
+            while True:
+                chunk = self._tmp.read(io.DEFAULT_BUFFER_SIZE * 256)
+                if not chunk: break
+                f.write(chunk)
+        self._tmp.close()
+
+########################################
+#############  Main method  ############
+########################################
+
+'''
+Solves every instance in 'source' and writes the arcs to 'destination'
+With workers > 1, instances are solved over a process pool (see parallel_solver.py)
+and still written in input order
+With max_rows set, 'source' is one NPY or raw instance that is solved out of core,
+holding about max_rows rows in memory at a time (see out_of_core.py)
+With a cache (a SolutionCache), instances solved before are looked up instead (see solution_cache.py)
+Returns: the number of instances solved
+'''
+def solve_file(source, destination = '-', input_format = None, output_format = None, workers = 1, max_rows = None,
+               cache = None):
+    if cache is not None and (workers > 1 or max_rows is not None):
+        raise ValueError('The solution cache is only used with one worker and without max_rows')
+
+    if output_format is None:
+        output_format = 'npy' if destination.endswith('.npy') else 'csv'
+
+    if output_format == 'npy':
+        if destination == '-':
+            raise ValueError('NPY output needs a file path')
+        writer = NPYArcWriter(destination)
+        out_file = None
+    else:
+        out_file = sys.stdout if destination == '-' else open(destination, 'w', newline = '')
+        writer = CSVArcWriter(out_file)
+
+    try:
+        if max_rows is not None:
+            if source == '-' or (input_format or os.path.splitext(source)[1][1:]) == 'csv':
+                raise ValueError('Out-of-core solving needs an NPY or raw input file')
+            centers = open_centers(source, input_format)
+            results = [(0, solve_disk_intersection_out_of_core(centers, max_rows))]
+        elif workers > 1:
+            results = solve_many(read_instances(source, input_format), max_workers = workers)
+        else:
+            solve = solve_disk_intersection if cache is None else cache.solve
+            results = ((instance, solve(centers)) for instance, centers in enumerate(read_instances(source, input_format)))
+
+        num_instances = 0
+        for instance, arcs in results:
+            writer.write(instance, arcs)
+            num_instances += 1
+        writer.close()
+    finally:
+        if out_file is not None and out_file is not sys.stdout:
+            out_file.close()
+    return num_instances
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Find the intersection of disks through the origin without plotting.')
+    parser.add_argument('input', nargs = '?', default = '-', help = 'CSV or NPY file of disk centers ("-" for CSV on stdin)')
+    parser.add_argument('-o', '--output', default = '-', help = 'CSV or NPY file for the arcs ("-" for CSV on stdout)')
+    parser.add_argument('--input-format', choices = ['csv', 'npy', 'raw'], help = 'Override the format inferred from the input file name')
+    parser.add_argument('--output-format', choices = ['csv', 'npy'], help = 'Override the format inferred from the output file name')
+    parser.add_argument('-j', '--workers', type = int, default = 1, help = 'Number of worker processes')
+    parser.add_argument('--max-rows', type = int, help = 'Solve one NPY or raw instance out of core, holding about this many rows in memory')
+    parser.add_argument('--cache', metavar = 'DIR', help = 'Reuse the solutions of disk sets solved before, kept in DIR (with -j 1)')
+    parser.add_argument('--cache-size', type = int, default = 1 << 30, help = 'Size in bytes the cache directory is kept under')
+    parser.add_argument('--profile', action = 'store_true', help = 'Print the time spent in each stage to stderr (with -j 1)')
+    parser.add_argument('--chrome-trace', metavar = 'FILE', help = 'Write every stage call as a Chrome trace JSON (with -j 1)')
+    args = parser.parse_args(argv)
+
+    if args.profile or args.chrome_trace is not None:
+        enable_profiling(trace = args.chrome_trace is not None)
+    try:
+        cache = None if args.cache is None else SolutionCache(directory = args.cache, max_disk_bytes = args.cache_size)
+        solve_file(args.input, args.output, args.input_format, args.output_format, args.workers, args.max_rows, cache)
+    finally:
+        profile = disable_profiling()
+        if profile is not None:
+            if args.profile:
+                print(profile.summary(), file = sys.stderr)
+            if args.chrome_trace is not None:
+                profile.dump_chrome_trace(args.chrome_trace)
+
+if __name__ == '__main__':
+    main()
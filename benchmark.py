@@ -0,0 +1,229 @@
+import numpy as np
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import zlib
+
+from duality_computation import (arrangement_bounds, chan_convex_hull, convex_hull, convex_hull_step, disk_intersection,
+                                 duality1_circlesToLines, duality2_linesToPoints, halfplane_envelope,
+                                 intersection_of_envelopes, intersection_points, merge_halfplanes,
+                                 prune_hull_candidates, solve_disk_intersection, _ReversedChain)
+
+'''
+Benchmarks each stage of the duality pipeline on seeded inputs of increasing size
+and writes the timings to JSON, so that runs from different commits can be compared
+
+Every stage is timed on its own, with its input precomputed by the stages before it:
+  duality1                  circle centers -> dual lines (duality1_circlesToLines)
+  duality2                  lines -> dual points of each orientation
+  convex_hull               sort and sweep both hulls (ConvexHullSweep), over all points
+  prune_hull_candidates     the prefilter that discards points inside both hulls
+  convex_hull_pruned        both hulls as solve_disk_intersection finds them (prefilter on large inputs, then sweep)
+  chan_convex_hull          both hulls with the output-sensitive algorithm, over all points
+  convex_hull_step          the same sweeps one convex_hull_step call at a time
+  halfplane_envelope        both hulls -> envelopes
+  intersection_of_envelopes the walk that finds where the envelopes cross
+  merge_halfplanes          envelopes -> boundary of the intersection region
+  disk_intersection         boundary -> arcs
+  arrangement_bounds        bounding box of all line intersections, O(n log n)
+  intersection_points       all line intersections, O(n^2) (only up to QUADRATIC_MAX_SIZE lines)
+  solve_disk_intersection   the whole pipeline end to end
+'''
+
+SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+QUADRATIC_MAX_SIZE = 2000
+
+###################################
+######  Seeded input families  ####
+###################################
+
+'''
+Each generator takes (n, rng) and returns an array of shape (n, 2) of circle centers
+'''
+
+# Centers uniform in the square [-1, 1]^2
+def random_disks(n, rng):
+    return rng.uniform(-1, 1, (n, 2))
+
+# Centers within 1e-9 of one line, so that dual points are nearly collinear
+def near_collinear(n, rng):
+    x = rng.uniform(-1, 1, n)
+    return np.column_stack([x, 0.5 + 0.25 * x + rng.normal(0, 1e-9, n)])
+
+# Every center above the x-axis, so the lower hull is empty
+def one_side(n, rng):
+    return np.column_stack([rng.uniform(-1, 1, n), rng.uniform(0.1, 1, n)])
+
+# Dual points of each orientation lie on a chain that stays on the hull until the
+# last (rightmost) point arrives and pops all of it in a single step
+def pop_heavy(n, rng):
+    n_upper = n // 2
+    centers = []
+    for count, sign in ((n_upper, 1), (n - n_upper, -1)):
+        if count == 0: continue
+        px = np.append(np.sort(rng.uniform(-1, 1, count - 1)), 2)
+        py = sign * (3 - px ** 2)
+        py[-1] = sign * 100
+        # Invert the dual point (x/y, 1/(2y)) of the center (x, y)
+        y = 1/(2 * py)
+        centers.append(np.column_stack([px * y, y]))
+    centers = np.concatenate(centers) if len(centers) > 0 else np.empty((0, 2))
+    return centers[rng.permutation(len(centers))]
+
+GENERATORS = {
+    'random': random_disks,
+    'near_collinear': near_collinear,
+    'one_side': one_side,
+    'pop_heavy': pop_heavy,
+}
+
+'''
+Returns the centers for one (generator, size), the same for a given seed
+however many other generators and sizes are run
+'''
+def generate(generator, n, seed = 0):
+    rng = np.random.default_rng([seed, zlib.crc32(generator.encode()), n])
+    return GENERATORS[generator](n, rng)
+
+###########################
+######  Stage timing  #####
+###########################
+
+'''
+Times each stage of the pipeline on one set of centers
+Input:
+- centers: array of shape (N, 2)
+- repeat: the most times each stage is run (the best time is reported)
+- max_time: a stage is not run again once its runs add up to this many seconds
+Returns: dict stage -> {'best', 'median', 'runs'} in seconds (or None if the stage was skipped)
+'''
+def benchmark_stages(centers, repeat = 5, max_time = 1.0):
+    results = {}
+    def timed(stage, func, *args):
+        times = []
+        while len(times) < repeat and sum(times) < max_time:
+            start = time.perf_counter()
+            value = func(*args)
+            times.append(time.perf_counter() - start)
+        results[stage] = {'best': min(times), 'median': float(np.median(times)), 'runs': len(times)}
+        return value
+
+    lines = timed('duality1', duality1_circlesToLines, centers)
+    points = timed('duality2', _split_points, lines)
+    hulls = timed('convex_hull', lambda: [convex_hull(points[hull_type], hull_type, prefilter = False) for hull_type in ('upper', 'lower')])
+    timed('prune_hull_candidates', lambda: [prune_hull_candidates(points[hull_type], hull_type) for hull_type in ('upper', 'lower')])
+    timed('convex_hull_pruned', lambda: [convex_hull(points[hull_type], hull_type) for hull_type in ('upper', 'lower')])
+    timed('chan_convex_hull', lambda: [chan_convex_hull(points[hull_type], hull_type) for hull_type in ('upper', 'lower')])
+    sorted_points = [sorted(map(tuple, points[hull_type].tolist())) for hull_type in ('upper', 'lower')]
+    timed('convex_hull_step', lambda: [_step_sweep(sorted_points[0], 'upper'), _step_sweep(sorted_points[1], 'lower')])
+
+    upper_envelope, lower_envelope = timed('halfplane_envelope', lambda: [
+        halfplane_envelope(hull, hull_type) if len(hull) > 0 else None for hull, hull_type in zip(hulls, ('upper', 'lower'))])
+    if upper_envelope is not None and lower_envelope is not None:
+        timed('intersection_of_envelopes', intersection_of_envelopes, _ReversedChain(upper_envelope.tolist()), lower_envelope.tolist())
+    else:
+        results['intersection_of_envelopes'] = None
+    edges = timed('merge_halfplanes', merge_halfplanes, upper_envelope, lower_envelope)
+    if edges is not None and len(edges) > 1:
+        timed('disk_intersection', disk_intersection, edges)
+    else:
+        results['disk_intersection'] = None
+
+    timed('arrangement_bounds', arrangement_bounds, lines)
+    if len(lines) <= QUADRATIC_MAX_SIZE:
+        timed('intersection_points', intersection_points, list(zip(lines['slope'].tolist(), lines['intercept'].tolist())))
+    else:
+        results['intersection_points'] = None
+    timed('solve_disk_intersection', solve_disk_intersection, centers)
+    return results
+
+def _split_points(lines):
+    return {hull_type: duality2_linesToPoints(lines[lines['orientation'] == orientation])
+            for hull_type, orientation in (('upper', 1), ('lower', -1))}
+
+def _step_sweep(points, hull_type):
+    state = convex_hull_step(points, hull_type)
+    while len(points) > 0 and not state[-1]:
+        state = convex_hull_step(points, hull_type, state)
+    return state
+
+'''
+Runs benchmark_stages for every generator and size
+Returns: the JSON-ready results, {'meta': {...}, 'results': [{'generator', 'size', 'stage', ...}]}
+'''
+def run_benchmarks(generators = None, sizes = None, seed = 0, repeat = 5, max_time = 1.0, log = None):
+    generators = list(GENERATORS) if generators is None else generators
+    sizes = SIZES if sizes is None else sizes
+    rows = []
+    for generator in generators:
+        for n in sizes:
+            centers = generate(generator, n, seed)
+            for stage, timing in benchmark_stages(centers, repeat, max_time).items():
+                if timing is None: continue
+                rows.append({'generator': generator, 'size': n, 'stage': stage, **timing})
+                if log is not None:
+                    print('%-15s %8d  %-26s %12.6f s' % (generator, n, stage, timing['best']), file = log)
+
+    meta = {'commit': _git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': seed, 'repeat': repeat,
+            'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'platform': platform.platform()}
+    return {'meta': meta, 'results': rows}
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)),
+                              capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+'''
+Compares two results from run_benchmarks
+Returns: a list of (generator, size, stage, baseline_best, current_best, ratio)
+         for every timing present in both, slowest ratio first
+'''
+def compare_results(baseline, current):
+    key = lambda row: (row['generator'], row['size'], row['stage'])
+    baseline_best = {key(row): row['best'] for row in baseline['results']}
+    rows = [(*key(row), baseline_best[key(row)], row['best'], row['best']/baseline_best[key(row)])
+            for row in current['results'] if key(row) in baseline_best and baseline_best[key(row)] > 0]
+    return sorted(rows, key = lambda row: -row[-1])
+
+########################################
+#############  Main method  ############
+########################################
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Time each stage of the duality pipeline on seeded inputs.')
+    parser.add_argument('-o', '--output', default = '-', help = 'JSON file for the results ("-" for stdout)')
+    parser.add_argument('--generators', nargs = '+', choices = list(GENERATORS), help = 'Input families to run (default: all)')
+    parser.add_argument('--sizes', nargs = '+', type = int, help = 'Numbers of disks (default: %s)' % ' '.join(map(str, SIZES)))
+    parser.add_argument('--seed', type = int, default = 0, help = 'Seed of the input generators')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'Most runs of each stage')
+    parser.add_argument('--compare', metavar = 'BASELINE', help = 'JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type = float, default = 1.1, help = 'Slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.generators, args.sizes, args.seed, args.repeat, log = sys.stderr)
+    if args.output == '-':
+        json.dump(results, sys.stdout, indent = 1)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = [row for row in compare_results(baseline, results) if row[-1] > args.threshold]
+        for generator, n, stage, old, new, ratio in regressions:
+            print('REGRESSION %-15s %8d  %-26s %10.6f -> %10.6f s (x%.2f)' % (generator, n, stage, old, new, ratio),
+                  file = sys.stderr)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
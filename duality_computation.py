@@ -1,7 +1,198 @@
 import numpy as np
-from matplotlib import pyplot as plt
-import random
-import math
+import array
+import contextlib
+import functools
+import json
+import threading
+import time
+import tracemalloc
+
+from geometry import LINE_DTYPE, ArcChain, Envelope, LineSet, PointSet
+from predicates import ORIENT_ERROR_BOUND, line_intersection, orient2d, orient2d_array, orient2d_exact, segment_intersection
+
+################################
+#### Opt-in instrumentation ####
+################################
+
+'''
+Profile
+    Per-stage statistics collected while profiling is enabled (see enable_profiling)
+    For each stage: number of calls, total and largest wall time, and (if enabled with
+    memory = True) the net bytes it allocated and the largest peak of its allocations,
+    as traced by tracemalloc, which also sees NumPy array buffers. Times and memory are
+    inclusive, so a stage that calls other stages also counts their time and memory.
+    Tracing memory slows every allocation down, so times are more accurate without it
+    Counters record finer events, such as the pops of each hull step
+Usage:
+  summary() returns a table of the stages and counters as a string
+  chrome_trace() / dump_chrome_trace(path) give every stage call as a Chrome trace
+  (if enabled with trace = True), viewable in chrome://tracing or Perfetto
+'''
+class Profile:
+    def __init__(self, trace = False, memory = True):
+        self.stages = {}    # name -> [calls, total_time, max_time, net_bytes, peak_bytes]
+        self.counters = {}
+        self.events = [] if trace else None
+        self.memory = memory
+        self.start_time = time.perf_counter()
+        self._peaks = threading.local()     # peak so far of each stage being run, innermost last
+
+    def count(self, name, n = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def count_max(self, name, value):
+        self.counters[name] = max(self.counters.get(name, value), value)
+
+    def add_call(self, name, start, elapsed, net_bytes = 0, peak_bytes = 0):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = [0, 0.0, 0.0, 0, 0]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+        stats[3] += net_bytes
+        stats[4] = max(stats[4], peak_bytes)
+        if self.events is not None:
+            self.events.append({'name': name, 'ph': 'X', 'pid': 0, 'tid': threading.get_ident(),
+                                'ts': (start - self.start_time) * 1e6, 'dur': elapsed * 1e6,
+                                'args': {'net_bytes': net_bytes, 'peak_bytes': peak_bytes}})
+
+    '''
+    Called as a stage starts
+    Returns: the bytes traced when the stage started
+    Note:
+      tracemalloc keeps one peak for the whole process, so it is reset for each stage,
+      after folding the peak seen so far into the stage that encloses it
+    '''
+    def enter_stage(self):
+        peaks = self._peaks.__dict__.setdefault('stack', [])
+        current, peak = tracemalloc.get_traced_memory()
+        if len(peaks) > 0:
+            peaks[-1] = max(peaks[-1], peak)
+        tracemalloc.reset_peak()
+        peaks.append(current)
+        return current
+
+    '''
+    Called as a stage ends
+    Returns: (net_bytes, peak_bytes), the bytes allocated and not freed by the stage and
+             the most bytes it had allocated at any time, both counted from 'start_bytes'
+    '''
+    def exit_stage(self, start_bytes):
+        peaks = self._peaks.stack
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peaks.pop(), peak)
+        if len(peaks) > 0:
+            peaks[-1] = max(peaks[-1], peak)
+        return current - start_bytes, peak - start_bytes
+
+    def summary(self):
+        rows = ['%-40s %10s %12s %12s %12s %12s' % ('stage', 'calls', 'total (s)', 'max (s)', 'net (KiB)', 'peak (KiB)')]
+        for name, (calls, total, longest, net_bytes, peak_bytes) in sorted(self.stages.items(), key = lambda item: -item[1][1]):
+            if self.memory:
+                memory = '%12.1f %12.1f' % (net_bytes/1024, peak_bytes/1024)
+            else:
+                memory = '%12s %12s' % ('-', '-')
+            rows.append('%-40s %10d %12.6f %12.6f %s' % (name, calls, total, longest, memory))
+        if len(self.counters) > 0:
+            rows.append('')
+            rows.append('%-40s %10s' % ('counter', 'count'))
+            for name, value in sorted(self.counters.items()):
+                rows.append('%-40s %10d' % (name, value))
+        return '\n'.join(rows)
+
+    def chrome_trace(self):
+        if self.events is None:
+            raise ValueError('Profiling was enabled without trace = True')
+        counters = {'name': 'counters', 'ph': 'C', 'pid': 0, 'ts': (time.perf_counter() - self.start_time) * 1e6,
+                    'args': dict(self.counters)}
+        return {'traceEvents': self.events + [counters], 'displayTimeUnit': 'ms'}
+
+    def dump_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+_profile = None
+
+_started_tracemalloc = False
+
+'''
+Starts collecting a Profile of the stages of this module, replacing any profile
+already being collected
+Input:
+- trace: if True, also keep every stage call for chrome_trace()
+- memory: if True, trace the memory each stage allocates (starting tracemalloc if needed)
+Returns: the Profile
+'''
+def enable_profiling(trace = False, memory = True):
+    global _profile, _started_tracemalloc
+    disable_profiling()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+    _profile = Profile(trace, memory)
+    return _profile
+
+'''
+Stops collecting and returns the Profile (or None if profiling was not enabled)
+tracemalloc is stopped again if enable_profiling started it
+'''
+def disable_profiling():
+    global _profile, _started_tracemalloc
+    profile, _profile = _profile, None
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+    return profile
+
+'''
+Context manager: profiles the stages run inside the block
+    with profiling() as profile:
+        solve_disk_intersection(centers)
+    print(profile.summary())
+'''
+@contextlib.contextmanager
+def profiling(trace = False, memory = True):
+    profile = enable_profiling(trace, memory)
+    try:
+        yield profile
+    finally:
+        if _profile is profile:
+            disable_profiling()
+
+'''
+Adds n to a counter of the current profile; does nothing when profiling is disabled
+'''
+def profile_count(name, n = 1):
+    if _profile is not None:
+        _profile.count(name, n)
+
+'''
+Decorator for the stages of the pipeline: when profiling is disabled, the only
+cost is one extra call and a check of _profile
+'''
+def _stage(func):
+    name = func.__qualname__
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _profile
+        if profile is None:
+            return func(*args, **kwargs)
+        if not profile.memory:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.add_call(name, start, time.perf_counter() - start)
+
+        start_bytes = profile.enter_stage()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            profile.add_call(name, start, elapsed, *profile.exit_stage(start_bytes))
+    return wrapper
 
 ########################################
 #### Methods for duality transforms ####
@@ -13,11 +204,42 @@ Input: A circle through the origin defined by a center point (x, y)
 Returns: The dual line defined by a tuple (slope, intercept, orientation)
 '''
 def duality1_circleToLine(circle_center):
-    x, y = circle_center
-    slope = -x/y
-    intercept = 1/(2*y)
-    orientation = 1 if y > 0 else -1
-    return (slope, intercept, orientation)
+    return tuple(duality1_circlesToLines([circle_center])[0])
+
+'''
+Inversion duality transform (vectorized)
+Input: array-like of shape (N, 2) of circle centers (x, y)
+Returns: LineSet of N lines (see LINE_DTYPE in geometry.py)
+'''
+@_stage
+def duality1_circlesToLines(circle_centers):
+    centers = np.asarray(circle_centers, dtype = np.float64).reshape(-1, 2)
+    x, y = centers[:, 0], centers[:, 1]
+    lines = np.empty(len(centers), dtype = LINE_DTYPE)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        lines['slope'] = -x/y
+        lines['intercept'] = 1/(2*y)
+        lines['orientation'] = np.sign(y)
+
+        # Centers on the x-axis: the halfplane is bounded by the vertical line x = 1/(2x)
+        vertical = (y == 0)
+        if vertical.any():
+            lines['slope'][vertical] = np.inf
+            lines['intercept'][vertical] = 1/(2*x[vertical])
+    return LineSet(lines)
+
+'''
+Returns the bounds (lower, upper) on x of the halfplanes of the vertical dual lines
+Input: LineSet (or structured array with dtype LINE_DTYPE)
+Note:
+  The vertical line x = c of a center (x, 0) bounds the halfplane x >= c if c > 0,
+  or x <= c if c < 0. lower is -inf and upper is inf if there is no such bound,
+  and lower >= upper means that the intersection is empty
+  (the center (0, 0) gives c = +/-inf, a disk that contains only the origin)
+'''
+def vertical_bounds(lines):
+    c = lines['intercept'][lines['orientation'] == 0]
+    return float(c[c > 0].max(initial = -np.inf)), float(c[c < 0].min(initial = np.inf))
 
 '''
 Inversion duality transform: translation back to primal
@@ -26,27 +248,44 @@ Returns: The arc (x, y, r, theta0, theta1) in the primal
          theta0, theta1 are measured in degrees
 '''
 def inverseDuality1_segmentToArc(point1, point2):
-    (x0, y0), (x1, y1) = point1, point2
-
-    # Find primal circle by first converting to point-slope form
-    slope = (y1 - y0)/(x1 - x0)
-    intercept = y0 - slope * x0
-    circle_y = 1/(2*intercept)
-    circle_x = -slope * circle_y
-    circle_radius = math.sqrt(circle_x ** 2 + circle_y ** 2)
+    arc = inverseDuality1_segmentsToArcs([point1], [point2])[0]
+    return tuple(arc.tolist())
 
-    # Find bounding angles
-    primal_x0, primal_y0 = x0/(x0 ** 2 + y0 ** 2), y0/(x0 ** 2 + y0 ** 2)
-    primal_x1, primal_y1 = x1/(x1 ** 2 + y1 ** 2), y1/(x1 ** 2 + y1 ** 2)
+'''
+Inversion duality transform: translation back to primal (vectorized)
+Input: two array-likes of shape (N, 2); row i of each gives the endpoints of segment i
+Returns: array of shape (N, 5), one arc (x, y, r, theta0, theta1) per row
+         theta0, theta1 are measured in degrees, in the range [-90, 270)
+'''
+@_stage
+def inverseDuality1_segmentsToArcs(points1, points2):
+    points1 = np.asarray(points1, dtype = np.float64).reshape(-1, 2)
+    points2 = np.asarray(points2, dtype = np.float64).reshape(-1, 2)
+    x0, y0 = points1[:, 0], points1[:, 1]
+    x1, y1 = points2[:, 0], points2[:, 1]
+    arcs = np.empty((len(points1), 5))
 
-    theta0 = math.atan((primal_y0 - circle_y)/(primal_x0 - circle_x)) * 180/math.pi
-    theta1 = math.atan((primal_y1 - circle_y)/(primal_x1 - circle_x)) * 180/math.pi
+    # The primal circle has the center c with q.c = 1/2 at both endpoints q,
+    # which also holds for vertical segments (no slope is needed). Written with
+    # the direction (dx, dy) of the segment, this stays accurate for short segments
+    dx, dy = x1 - x0, y1 - y0
+    det = 2 * (x0 * dy - y0 * dx)
+    circle_x = dy/det
+    circle_y = -dx/det
+    arcs[:, 0] = circle_x
+    arcs[:, 1] = circle_y
+    arcs[:, 2] = np.hypot(circle_x, circle_y)
 
-    # Deal with the fact that atan returns a number in [-pi/2, pi/2], which cannot differentiate between quadrants
-    if   primal_x0 - circle_x < 0: theta0 = 180 + theta0
-    if   primal_x1 - circle_x < 0: theta1 = 180 + theta1
+    # Find bounding angles
+    norm0 = x0 ** 2 + y0 ** 2
+    norm1 = x1 ** 2 + y1 ** 2
+    arcs[:, 3] = np.degrees(np.arctan2(y0/norm0 - circle_y, x0/norm0 - circle_x))
+    arcs[:, 4] = np.degrees(np.arctan2(y1/norm1 - circle_y, x1/norm1 - circle_x))
 
-    return (circle_x, circle_y, circle_radius, theta0, theta1)
+    # Keep the angles in [-90, 270) like the scalar atan-based version always has
+    theta = arcs[:, 3:]
+    theta[theta < -90] += 360
+    return arcs
 
 '''
 Point-line dual transformation
@@ -57,6 +296,17 @@ def duality2_lineToPoint(line):
     m, b, orientation = line
     return (-m, b)
 
+'''
+Point-line dual transformation (vectorized)
+Input: LineSet or structured array with dtype LINE_DTYPE, or an array-like of shape
+       (N, 2) or (N, 3) whose first two columns are (m, b)
+Output: array of shape (N, 2) of points (x, y)
+'''
+@_stage
+def duality2_linesToPoints(lines):
+    slope, intercept = _line_columns(lines)
+    return np.column_stack((-slope, intercept))
+
 '''
 Point-line dual transformation: translation back to primal
 Input: tuple (x, y) representing a point
@@ -66,6 +316,28 @@ def inverseDuality2_pointToLine(point):
     x, y = point
     return (-x, y)
 
+'''
+Point-line dual transformation: translation back to primal (vectorized)
+Input: array-like of shape (N, 2) of points (x, y)
+Output: array of shape (N, 2) of lines (m, b)
+'''
+@_stage
+def inverseDuality2_pointsToLines(points):
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+    return np.column_stack((-points[:, 0], points[:, 1]))
+
+'''
+Returns the (slope, intercept) columns of an array of lines
+'''
+def _line_columns(lines):
+    if isinstance(lines, LineSet):
+        lines = lines.array
+    if isinstance(lines, np.ndarray) and lines.dtype.names is not None:
+        return lines['slope'], lines['intercept']
+    lines = np.asarray(lines, dtype = np.float64)
+    lines = lines.reshape(len(lines), -1)
+    return lines[:, 0], lines[:, 1]
+
 #################################
 ### Solve convex hull problem ###
 #################################
@@ -83,6 +355,7 @@ Input:
 Output:
 - state: tuple like the input parameter, representing the state after the method terminates
 '''
+@_stage
 def convex_hull_step(points, hull_type, state = None):
     if state is None:
         if len(points) == 0: return [], [], None, True
@@ -94,25 +367,398 @@ def convex_hull_step(points, hull_type, state = None):
 
     hull, step_num, done = state
     curr_point = points[step_num]
+    size = len(hull)
 
     if hull_type == 'upper':
         while len(hull) >= 2 and left_turn(hull[-2], hull[-1], curr_point):
-            hull = hull[:-1]    
+            hull.pop()
         hull.append(curr_point)
     elif hull_type == 'lower':
         while len(hull) >= 2 and not left_turn(hull[-2], hull[-1], curr_point):
-            hull = hull[:-1]
+            hull.pop()
         hull.append(curr_point)
 
+    if _profile is not None:
+        pops = size + 1 - len(hull)
+        _profile.count('convex_hull_step.pops', pops)
+        _profile.count('left_turn', pops + (size - pops >= 2))
+
     next_step = step_num + 1
     done = (next_step >= len(points))
     new_state = (hull, next_step, done)
     return new_state
 
-
+'''
+Returns True if and only if p1 -> p2 -> p3 turns counterclockwise
+(decided exactly, see predicates.py)
+'''
 def left_turn(p1, p2, p3):
-    determinant = np.linalg.det([[p1[0], p1[1], 1], [p2[0], p2[1], 1], [p3[0], p3[1], 1]])
-    return determinant > 0
+    return orient2d(p1, p2, p3) > 0
+
+'''
+ConvexHullSweep
+    Array-backed engine for the sweepline convex hull algorithm
+    The hull is kept as a preallocated stack of point indices, so each pop is O(1)
+    and a full sweep over n points is O(n)
+Input:
+- points: array-like of points (x, y) sorted by x-coordinate, with no two sharing
+          an x-coordinate (as returned by sort_for_hull), so that no two neighbouring
+          hull points dualize to parallel lines
+- hull_type: 'upper' or 'lower'
+Usage:
+  step() processes one more point and returns the same (hull, step_num, done) state
+  as convex_hull_step, with hull given as an array of shape (h, 2)
+  step(count) processes up to 'count' more points before returning the state
+  run() processes all remaining points and returns the final hull
+  With record = True, the points popped by each step are logged (see sweep_trace.py):
+  popped holds them step after step, in stack order, and the ones popped by step i
+  are popped[pop_offsets[i]:pop_offsets[i + 1]]
+'''
+class ConvexHullSweep:
+    def __init__(self, points, hull_type, record = False):
+        self.points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+        self.hull_type = hull_type
+        self.step_num = 0
+        self.last_pops = 0
+        self._xs = self.points[:, 0].tolist()
+        self._ys = self.points[:, 1].tolist()
+        self._stack = array.array('q', bytes(8 * len(self.points)))
+        self._top = 0
+        self.popped = array.array('q') if record else None
+        self.pop_offsets = array.array('q', [0]) if record else None
+
+    @property
+    def done(self):
+        return self.step_num >= len(self.points)
+
+    @property
+    def hull_indices(self):
+        return np.frombuffer(self._stack, dtype = np.int64, count = self._top)
+
+    @property
+    def hull(self):
+        return self.points[self.hull_indices]
+
+    def state(self):
+        return (self.hull, self.step_num, self.done)
+
+    def step(self, count = 1):
+        if not self.done:
+            self._advance(min(self.step_num + count, len(self.points)))
+        return self.state()
+
+    def run(self):
+        self._advance(len(self.points))
+        return self.hull
+
+    # Processes points up to (but not including) index 'stop'
+    def _advance(self, stop):
+        if _profile is None:
+            self._sweep(stop)
+        else:
+            self._profiled_sweep(stop)
+
+    # Runs _sweep with the pops of each step logged, to count them in the profile
+    def _profiled_sweep(self, stop):
+        first_top = self._top
+        recording = self.popped is not None
+        if not recording:
+            self.popped, self.pop_offsets = array.array('q'), array.array('q', [0])
+        first_offset = len(self.pop_offsets) - 1
+        try:
+            self._sweep(stop)
+        finally:
+            pops = np.diff(np.frombuffer(self.pop_offsets, dtype = np.int64)[first_offset:])
+            if not recording:
+                self.popped = self.pop_offsets = None
+
+        # A step pops k points after k cross products, plus one more that stops
+        # the popping if at least two points are left on the stack
+        sizes_after_pops = first_top + np.cumsum(1 - pops) - 1
+        _profile.count('ConvexHullSweep.steps', len(pops))
+        _profile.count('ConvexHullSweep.pops', int(pops.sum()))
+        _profile.count('ConvexHullSweep.cross_products', int(pops.sum()) + int(np.count_nonzero(sizes_after_pops >= 2)))
+        if len(pops) > 0:
+            _profile.count_max('ConvexHullSweep.max_pops_per_step', int(pops.max()))
+
+    @_stage
+    def _sweep(self, stop):
+        xs, ys, stack, top = self._xs, self._ys, self._stack, self._top
+        popped, pop_offsets = self.popped, self.pop_offsets
+        upper = (self.hull_type == 'upper')
+        error_bound = ORIENT_ERROR_BOUND
+        pops = 0
+        for i in range(self.step_num, stop):
+            x, y = xs[i], ys[i]
+            pops = 0
+            while top >= 2:
+                j, k = stack[top - 2], stack[top - 1]
+                xj, yj = xs[j], ys[j]
+                left = (xs[k] - xj) * (y - yj)
+                right = (ys[k] - yj) * (x - xj)
+                cross = left - right
+                # Float filter of orient2d, inlined since this is the hot loop
+                # (left and right have exact signs, so |left + right| is their sum
+                # whenever cancellation is possible)
+                if abs(cross) <= error_bound * abs(left + right):
+                    cross = orient2d_exact((xj, yj), (xs[k], ys[k]), (x, y))
+                if (cross <= 0) if upper else (cross > 0): break
+                top -= 1
+                pops += 1
+            if popped is not None:
+                # Popped entries are still in the stack buffer above the new top
+                if pops > 0: popped.extend(stack[top:top + pops])
+                pop_offsets.append(len(popped))
+            stack[top] = i
+            top += 1
+        self._top = top
+        self.last_pops = pops
+        self.step_num = max(self.step_num, stop)
+
+# Below this many points the fixed cost of the numpy calls of prune_hull_candidates
+# (some 50 us) is more than it saves the sweep, even when it discards nearly every point
+PREFILTER_MIN_POINTS = 128
+
+'''
+convex_hull
+    Finds the upper/lower hull of all points at once
+Input:
+- points: array-like of points (x, y), in any order
+- hull_type: 'upper' or 'lower'
+- method: 'sweep' for the sweepline algorithm, O(n) after sorting, or 'chan' for
+          chan_convex_hull, whose running time depends on the size of the hull
+- prefilter: if True, points that cannot be on the hull are discarded first
+             (see prune_hull_candidates) when there are at least PREFILTER_MIN_POINTS,
+             which does not change the result
+Output:
+- hull: array of shape (h, 2) containing the points of the upper/lower hull
+        sorted by increasing x-coordinate
+'''
+@_stage
+def convex_hull(points, hull_type, method = 'sweep', prefilter = True):
+    if prefilter and len(points) >= PREFILTER_MIN_POINTS:
+        points = prune_hull_candidates(points, hull_type)
+    if method == 'chan':
+        return chan_convex_hull(points, hull_type)
+    return ConvexHullSweep(sort_for_hull(points, hull_type), hull_type).run()
+
+'''
+Sorts points by x-coordinate for the sweepline convex hull algorithm
+Input:
+- points: array-like of points (x, y), in any order
+- hull_type: 'upper' or 'lower'
+Output:
+- array of shape (n, 2) sorted by increasing x-coordinate
+Note:
+  Only the dominant point (highest for 'upper', lowest for 'lower') is kept
+  among points that share an x-coordinate, since the others dualize to
+  parallel lines that never appear on the envelope
+'''
+@_stage
+def sort_for_hull(points, hull_type):
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+    if len(points) == 0: return points
+
+    # Sort by x-coordinate, with the dominant point last within each x-coordinate
+    tie_break = points[:, 1] if hull_type == 'upper' else -points[:, 1]
+    points = points[np.lexsort((tie_break, points[:, 0]))]
+    keep = np.append(points[1:, 0] != points[:-1, 0], True)
+    return points[keep]
+
+'''
+Merges the hulls of two point sets that are separated in x
+Input:
+- left_hull, right_hull: arrays of shape (h, 2) as returned by convex_hull,
+                         with every point of left_hull to the left of right_hull
+- hull_type: 'upper' or 'lower'
+Output:
+- hull: array containing the hull of the union, equal to what convex_hull would return
+Note:
+  Walks inwards from the facing ends of the two hulls until neither end can be
+  popped, which leaves the bridge (common tangent) between them
+'''
+@_stage
+def merge_hulls(left_hull, right_hull, hull_type):
+    if len(left_hull) == 0: return right_hull
+    if len(right_hull) == 0: return left_hull
+
+    upper = (hull_type == 'upper')
+    def pops(p1, p2, p3):
+        turn = orient2d(p1, p2, p3)
+        return (turn > 0) if upper else (turn <= 0)
+
+    left, right = left_hull.tolist(), right_hull.tolist()
+    i, j = len(left) - 1, 0
+    moved = True
+    while moved:
+        moved = False
+        while i > 0 and pops(left[i - 1], left[i], right[j]):
+            i -= 1
+            moved = True
+        while j < len(right) - 1 and pops(left[i], right[j], right[j + 1]):
+            j += 1
+            moved = True
+    return np.concatenate((left_hull[:i + 1], right_hull[j:]))
+
+'''
+Discards points that cannot be on the upper/lower hull (Akl-Toussaint heuristic)
+Input:
+- points: array-like of points (x, y), in any order
+- hull_type: 'upper' or 'lower'
+Output:
+- array of shape (k, 2) of the remaining points, in their original order, with
+  the same hull as 'points'
+Note:
+  The points extreme in x (the highest for 'upper', lowest for 'lower', among ties),
+  in y, and along the two diagonals are all on the hull, so the chain through them
+  in x order lies under the upper hull (over the lower hull). Points strictly on the
+  other side of that chain are left out; in typical inputs that is nearly all of
+  them. Only the float filter of orient2d is used: points it cannot place, such as
+  the chain's own vertices, are kept for the sweep to decide exactly
+'''
+@_stage
+def prune_hull_candidates(points, hull_type):
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+    if len(points) < 3: return points
+
+    # Mirror the lower hull problem into an upper hull problem
+    x, y = points[:, 0], (points[:, 1] if hull_type == 'upper' else -points[:, 1])
+    leftmost = np.flatnonzero(x == x.min())
+    rightmost = np.flatnonzero(x == x.max())
+    extremes = [leftmost[np.argmax(y[leftmost])], rightmost[np.argmax(y[rightmost])],
+                np.argmax(y), np.argmax(y + x), np.argmax(y - x)]
+    chain = np.array(sorted(set(zip(x[extremes].tolist(), y[extremes].tolist()))))
+    if len(chain) < 2: return points
+
+    segment = np.clip(np.searchsorted(chain[:, 0], x, side = 'right') - 1, 0, len(chain) - 2)
+    below = orient2d_array(chain[segment, 0], chain[segment, 1], chain[segment + 1, 0], chain[segment + 1, 1],
+                           x, y, exact = False) < 0
+    profile_count('prune_hull_candidates.discarded', int(np.count_nonzero(below)))
+    return points[~below]
+
+'''
+Output-sensitive convex_hull in the style of Chan's algorithm
+Input:
+- points: array-like of points (x, y), in any order
+- hull_type: 'upper' or 'lower'
+Output:
+- hull: array of shape (h, 2), the same as convex_hull(points, hull_type)
+Note:
+  For a guess m of the hull size, the sorted points are split into groups of m
+  neighbours in x, whose hulls are found together, one step of the sweep for all
+  groups at a time. Starting from the leftmost point, each next hull vertex is then
+  the best tangent from the current one to the groups on its right, found by binary
+  search in all groups at once. If the hull has more than m points, m is squared and
+  it starts over. The sort is O(n log n) but runs in numpy; everything else takes
+  O(n log h) time in O(h log h) numpy calls, instead of the sweep's n Python steps.
+  Once m would pass sqrt(n), there are too few groups for the numpy calls to pay
+  off, and the sweep is run instead
+'''
+@_stage
+def chan_convex_hull(points, hull_type):
+    points = sort_for_hull(points, hull_type)
+    group_size = 4
+    while group_size ** 2 <= len(points):
+        hull = _chan_hull_attempt(points, hull_type, group_size)
+        if hull is not None: return hull
+        group_size = group_size ** 2
+    return ConvexHullSweep(points, hull_type).run()
+
+# chan_convex_hull for one guess of the hull size, or None if the hull is larger than that
+def _chan_hull_attempt(points, hull_type, group_size):
+    profile_count('chan_convex_hull.attempts')
+    xs, ys, sizes = _group_hulls(points, hull_type, group_size)
+    upper = (hull_type == 'upper')
+    num_groups = len(sizes)
+    # Point i of the hull of group g is at g * group_size + i in xs and ys
+    last = (num_groups - 1) * group_size + sizes[-1] - 1
+
+    vertices = [0]
+    while vertices[-1] != last:
+        if len(vertices) == group_size: return None
+        vertex = vertices[-1]
+        group, index = divmod(vertex, group_size)
+        px, py = xs[vertex], ys[vertex]
+
+        # Candidates are the rest of this group's hull and every group to the right
+        low = np.arange(group, num_groups) * group_size
+        high = low + sizes[group:] - 1
+        low[0] = vertex + 1
+        nonempty = (low <= high)
+        low, high = low[nonempty], high[nonempty]
+
+        # Binary search for the tangent: while the next vertex of a group's hull turns
+        # the wrong way as seen from p (the way a sweep would pop), it is a better candidate
+        searching = np.flatnonzero(low < high)
+        while len(searching) > 0:
+            mid = (low[searching] + high[searching]) // 2
+            turn = orient2d_array(px, py, xs[mid], ys[mid], xs[mid + 1], ys[mid + 1])
+            advance = (turn > 0) if upper else (turn <= 0)
+            low[searching[advance]] = mid[advance] + 1
+            high[searching[~advance]] = mid[~advance]
+            searching = searching[low[searching] < high[searching]]
+
+        vertices.append(_best_tangent(px, py, low, xs, ys, upper))
+
+    vertices = np.array(vertices)
+    return np.stack([xs[vertices], ys[vertices]], axis = 1)
+
+# The candidate that p sees at the largest slope for 'upper' (the smallest for 'lower');
+# ties (collinear with p) go to the nearest point for 'upper' and the farthest for
+# 'lower', as in the sweep. All candidates are to the right of p
+def _best_tangent(px, py, candidates, xs, ys, upper):
+    cx, cy = xs[candidates], ys[candidates]
+    with np.errstate(over = 'ignore'):
+        slopes = (cy - py)/(cx - px) if upper else (py - cy)/(cx - px)
+    best = slopes.max()
+    if np.isfinite(best):
+        # Slopes are within a few rounding errors of exact, so only the close ones need exact comparison
+        close = slopes >= best - 8 * ORIENT_ERROR_BOUND * (abs(best) + np.abs(slopes))
+        candidates, cx, cy = candidates[close], cx[close], cy[close]
+
+    # Halving tournament with exact comparisons
+    remaining = np.arange(len(candidates))
+    while len(remaining) > 1:
+        half = len(remaining) // 2
+        first, second = remaining[:half], remaining[half:2 * half]
+        turn = orient2d_array(px, py, cx[first], cy[first], cx[second], cy[second])
+        if upper:
+            take_second = (turn > 0) | ((turn == 0) & (cx[second] < cx[first]))
+        else:
+            take_second = (turn < 0) | ((turn == 0) & (cx[second] > cx[first]))
+        remaining = np.concatenate((np.where(take_second, second, first), remaining[2 * half:]))
+    return int(candidates[remaining[0]])
+
+# Hulls of consecutive groups of 'group_size' sorted points, all swept in lockstep
+# Returns (xs, ys, sizes): the hull of group g is at g * group_size + [0, sizes[g]) in xs and ys
+def _group_hulls(points, hull_type, group_size):
+    num_groups = -(-len(points) // group_size)
+    xs = np.full(num_groups * group_size, np.nan)
+    ys = np.full(num_groups * group_size, np.nan)
+    xs[:len(points)], ys[:len(points)] = points[:, 0], points[:, 1]
+    lengths = np.full(num_groups, group_size)
+    lengths[-1] = len(points) - (num_groups - 1) * group_size
+
+    # stack holds point indices (into xs and ys) and top the size of each group's stack
+    upper = (hull_type == 'upper')
+    starts = np.arange(num_groups) * group_size
+    stack = np.zeros(num_groups * group_size, dtype = np.intp)
+    top = np.zeros(num_groups, dtype = np.intp)
+    for step in range(group_size):
+        pending = np.flatnonzero(lengths > step)
+        popping = pending
+        while True:
+            popping = popping[top[popping] >= 2]
+            if len(popping) == 0: break
+            tops = starts[popping] + top[popping]
+            j, k, i = stack[tops - 2], stack[tops - 1], starts[popping] + step
+            turn = orient2d_array(xs[j], ys[j], xs[k], ys[k], xs[i], ys[i])
+            popping = popping[(turn > 0) if upper else (turn <= 0)]
+            top[popping] -= 1
+        stack[starts[pending] + top[pending]] = starts[pending] + step
+        top[pending] += 1
+
+    return xs[stack], ys[stack], top
 
 #########################################################
 ### Translate into language of halfplane intersection ###
@@ -120,7 +766,7 @@ def left_turn(p1, p2, p3):
 
 '''
 Find the interpretation of the current convex hull in space of halfplanes
-Returns a list of points (x, y) that define the intersection
+Returns an Envelope of the points (x, y) that define the intersection
 
 Note:
   If hull_type is 'lower', the input 'convex_hull_points' must be sorted by increasing x-coordinate
@@ -129,9 +775,18 @@ Note:
   If hull_type is 'upper', points are sorted by decreasing x-coordinate
                            (ie. clockwise order around the region)
 '''
+@_stage
 def halfplane_envelope(convex_hull_points, type):
-    lines = [inverseDuality2_pointToLine(point) for point in convex_hull_points]
-    intersections = neighboring_intersections(lines)
+    lines = inverseDuality2_pointsToLines(convex_hull_points)
+    slope, intercept = lines[:, 0], lines[:, 1]
+
+    # Same as neighboring_intersections, for all neighbours at once
+    crossing = (slope[:-1] != slope[1:])
+    m_1, b_1 = slope[:-1][crossing], intercept[:-1][crossing]
+    m_2, b_2 = slope[1:][crossing], intercept[1:][crossing]
+    vertices = np.empty((len(m_1) + 2, 2))
+    vertices[1:-1, 0] = (b_2 - b_1)/(m_1 - m_2)
+    vertices[1:-1, 1] = m_1 * vertices[1:-1, 0] + b_1
     
      # Set min_x, max_x as proxies for +/- infinity
      # Differentiate upper/lower hull so that no points have the same x-coordinate
@@ -141,57 +796,117 @@ def halfplane_envelope(convex_hull_points, type):
         min_x, max_x = -1010, 1010
     
     if type == 'upper':
-        m_right, b_right = lines[0]
-        m_left, b_left = lines[-1]
-        right_y = m_right * max_x + b_right
-        left_y = m_left * min_x + b_left
-        intersections.insert(0, (max_x, right_y))
-        intersections.append((min_x, left_y))
+        m_right, b_right = slope[0], intercept[0]
+        m_left, b_left = slope[-1], intercept[-1]
+        vertices[0] = (max_x, m_right * max_x + b_right)
+        vertices[-1] = (min_x, m_left * min_x + b_left)
     elif type == 'lower':
-        m_right, b_right = lines[-1]
-        m_left, b_left = lines[0]
-        right_y = m_right * max_x + b_right
-        left_y = m_left * min_x + b_left
-        intersections.insert(0, (min_x, left_y))
-        intersections.append((max_x, right_y))
+        m_right, b_right = slope[-1], intercept[-1]
+        m_left, b_left = slope[0], intercept[0]
+        vertices[0] = (min_x, m_left * min_x + b_left)
+        vertices[-1] = (max_x, m_right * max_x + b_right)
 
-    return intersections
+    return Envelope(vertices, type)
+
+'''
+IncrementalEnvelope
+    Maintains halfplane_envelope(hull, hull_type) while the hull changes one sweep step at a time
+    A hull step pops k points and pushes one, so only the tail intersections and the
+    sentinel endpoints change, for amortized O(1) work per step
+Usage:
+  update(hull) brings the envelope in line with the hull after one or more sweep steps
+  push(point) / pop() mirror single hull stack operations
+  vertices is a list of the points (x, y) halfplane_envelope would return for the
+  current hull; it is updated in place, so callers that keep it across steps should copy it
+'''
+class IncrementalEnvelope:
+    def __init__(self, hull_type):
+        self.hull_type = hull_type
+
+        # Same proxies for +/- infinity as halfplane_envelope
+        if hull_type == 'upper':
+            self.start_x, self.end_x = 1000, -1000
+        else:
+            self.start_x, self.end_x = -1010, 1010
+
+        self.vertices = []
+        self._points = []
+        self._lines = []
+
+    def __len__(self):
+        return len(self._points)
+
+    def push(self, point):
+        x, y = float(point[0]), float(point[1])
+        m, b = inverseDuality2_pointToLine((x, y))
+        if len(self._lines) == 0:
+            self.vertices.append((self.start_x, m * self.start_x + b))
+        else:
+            m_1, b_1 = self._lines[-1]
+            intersection = line_intersection(m_1, b_1, m, b)
+            if intersection is None:
+                # Hull points that share an x-coordinate give parallel lines:
+                # leave a zero-length segment, which disk_intersection drops
+                intersection = self.vertices[-2] if len(self.vertices) > 1 else self.vertices[-1]
+            self.vertices[-1] = intersection
+        self.vertices.append((self.end_x, m * self.end_x + b))
+        self._points.append((x, y))
+        self._lines.append((m, b))
+
+    def pop(self):
+        self._points.pop()
+        self._lines.pop()
+        self.vertices.pop()
+        if len(self._lines) == 0:
+            self.vertices.clear()
+        else:
+            m, b = self._lines[-1]
+            self.vertices[-1] = (self.end_x, m * self.end_x + b)
+
+    @_stage
+    def update(self, hull):
+        # The hull is a stack: keep the longest prefix that is still unchanged
+        keep = min(len(self._points), len(hull))
+        while keep > 0 and self._points[keep - 1] != (hull[keep - 1][0], hull[keep - 1][1]):
+            keep -= 1
+        if _profile is not None:
+            _profile.count('IncrementalEnvelope.pops', len(self._points) - keep)
+            _profile.count('IncrementalEnvelope.pushes', len(hull) - keep)
+        while len(self._points) > keep:
+            self.pop()
+        for point in hull[keep:]:
+            self.push(point)
+        return self.vertices
 
 '''
 Merge two convex chains that are guaranteed to intersect at at most 1 point
-Returns a list of intersection points (x, y) that traverse the intersection region
+Input: two Envelopes (or lists of points (x, y)) as returned by halfplane_envelope;
+       either may be None or empty
+Returns a PointSet of intersection points (x, y) that traverse the intersection region
     in order of descending y-coordinate
+The input envelopes are not modified
 '''
+@_stage
 def merge_halfplanes(upper_envelope, lower_envelope):
     if upper_envelope is None or len(upper_envelope) == 0:
-        edges = lower_envelope
-    elif lower_envelope is None or len(lower_envelope) == 0:
-        edges = upper_envelope
-    else:
-        upper_envelope.reverse()
-        intersection, (lower_index, upper_index) = intersection_of_envelopes(upper_envelope, lower_envelope)
-        
-        if intersection is None: return []
-        intersection_left = (upper_envelope[0][1] < lower_envelope[0][1])
-
-        if intersection_left:
-            lower_edges = lower_envelope[:lower_index + 1]
-            upper_edges = upper_envelope[:upper_index + 1]
-            upper_edges.reverse()
-
-            edges = lower_edges
-            edges.append(intersection)
-            edges.extend(upper_edges)
-        else:
-            lower_edges = lower_envelope[lower_index + 1:]
-            upper_edges = upper_envelope[upper_index + 1:]
-            upper_edges.reverse()
+        return PointSet(() if lower_envelope is None else lower_envelope)
+    if lower_envelope is None or len(lower_envelope) == 0:
+        return PointSet(upper_envelope)
+
+    upper_envelope, lower_envelope = PointSet(upper_envelope).array, PointSet(lower_envelope).array
+    # upper_envelope runs in order of decreasing x-coordinate
+    intersection, (lower_index, upper_index) = intersection_of_envelopes(
+        _ReversedChain(upper_envelope.tolist()), lower_envelope.tolist())
+    
+    if intersection is None: return PointSet()
+    intersection_left = (upper_envelope[-1, 1] < lower_envelope[0, 1])
+    upper_split = len(upper_envelope) - 1 - upper_index
 
-            edges = upper_edges
-            edges.append(intersection)
-            edges.extend(lower_edges)
-        
-    return edges
+    if intersection_left:
+        edges = (lower_envelope[:lower_index + 1], [intersection], upper_envelope[upper_split:])
+    else:
+        edges = (upper_envelope[:upper_split], [intersection], lower_envelope[lower_index + 1:])
+    return PointSet(np.concatenate(edges))
 
 ## Helper methods for halfplane methods ##
 
@@ -199,110 +914,97 @@ def merge_halfplanes(upper_envelope, lower_envelope):
 Finds (at most one) intersection between two convex chains
 Input: two chains of points (x, y) in order of increasing x-coordinate
 Returns:
-  If an intersection is found, return (x, y), (upper_index, lower_indes)
+  If an intersection is found, return (x, y), [lower_index, upper_index]
     where (x, y) is the location of the intersection
-    and upper_index, lower_index are the highest indices of points *before* the intersection
-  If no intersection is found, return None, (None, None)
+    and lower_index, upper_index are the highest indices of points *before* the intersection
+  If no intersection is found, return None, [None, None]
+Note:
+  Walks both chains at once, always moving past whichever vertex comes first,
+  so each segment is tested against the one segment of the other chain that
+  overlaps it in x. This takes O(n) time
 '''
+@_stage
 def intersection_of_envelopes(upper_envelope, lower_envelope):
-    stopping_points = [(x, y, 'upper') for x, y in upper_envelope[1:]]
-    stopping_points.extend([(x, y, 'lower') for x, y in lower_envelope[1:]])
-    stopping_points.sort(key = lambda point: point[0])
-
-    envelopes = [lower_envelope, upper_envelope]
-    curr_index = [0, 0]
-
-    # Initial check for intersection
-    lower_p0, lower_p1 = lower_envelope[0], lower_envelope[1]
-    upper_p0, upper_p1 = upper_envelope[0], upper_envelope[1]
-    intersection = intersection_of_segments(lower_p0, lower_p1, upper_p0, upper_p1)
-    if intersection is not None:
-        return intersection, curr_index
-
-    for i, point in enumerate(stopping_points):
-        x, y, point_type = point
-        if point_type == 'intersection':
-            return (x, y), curr_index
-
-        primary_index = 1 if point_type == 'upper' else 0
-        secondary_index = 0 if point_type == 'upper' else 1
-        primary_label = 'upper' if primary_index == 1 else 'lower'
-        secondary_label = 'lower' if primary_index == 1 else 'upper'
-        primary_envelope = envelopes[primary_index]
-        secondary_envelope = envelopes[secondary_index]
-        currently_testing = curr_index[primary_index] + 1
+    lower_index, upper_index = 0, 0
+    while True:
+        intersection = intersection_of_segments(lower_envelope[lower_index], lower_envelope[lower_index + 1],
+                                                upper_envelope[upper_index], upper_envelope[upper_index + 1])
+        if intersection is not None:
+            profile_count('intersection_of_envelopes.segment_tests', lower_index + upper_index + 1)
+            return intersection, [lower_index, upper_index]
+
+        if upper_envelope[upper_index + 1][0] <= lower_envelope[lower_index + 1][0]:
+            upper_index += 1
+        else:
+            lower_index += 1
 
         # If we need to process the last points (ie at infinity),
         # we know there can be no intersection
-        if (currently_testing + 1 >= len(primary_envelope)
-            or curr_index[secondary_index] + 1 >= len(secondary_envelope)):
+        if upper_index + 1 >= len(upper_envelope) or lower_index + 1 >= len(lower_envelope):
+            profile_count('intersection_of_envelopes.segment_tests', lower_index + upper_index)
             return None, [None, None]
 
-        assert((x,y) == primary_envelope[currently_testing])
-        primary_point1, primary_point2 = ((x, y), primary_envelope[currently_testing + 1])
-        secondary_point1, secondary_point2 = (secondary_envelope[curr_index[secondary_index]], secondary_envelope[curr_index[secondary_index] + 1])
-        intersection = intersection_of_segments(primary_point1, primary_point2, secondary_point1, secondary_point2)
+'''
+Read-only view of a chain of points in reverse order, used to walk an envelope
+backwards without copying it
+'''
+class _ReversedChain:
+    def __init__(self, chain):
+        self._chain = chain
 
-        curr_index[primary_index] += 1
+    def __len__(self):
+        return len(self._chain)
 
-        if intersection is not None:
-            stopping_points.append((intersection[0], intersection[1], 'intersection'))
-            stopping_points.sort()
+    def __getitem__(self, index):
+        return self._chain[len(self._chain) - 1 - index]
 
 '''
 Returns a list (x, y) of intersection points between a lines next to each other
 in a list of (slope, intercept)
+Parallel neighbours (which only come from repeated points) are skipped
 '''
 def neighboring_intersections(lines):
-    x_list = []
-    y_list = []
+    intersections = []
     for i in range(len(lines) - 1):
         m_1, b_1 = lines[i]
         m_2, b_2 = lines[i + 1]
-        intersection_x = (b_2 - b_1)/(m_1 - m_2)
-        intersection_y = m_1 * intersection_x + b_1
-        x_list.append(intersection_x)
-        y_list.append(intersection_y)
-    intersections = [(x, y) for x, y in zip(x_list, y_list)]
+        intersection = line_intersection(m_1, b_1, m_2, b_2)
+        if intersection is not None:
+            intersections.append(intersection)
     return intersections
 
 '''
 Finds the slope and intercept of a line through two points (x, y)
+Returns None if the points have the same x-coordinate
 '''
 def convert_to_slope_intercept(point1, point2):
     x0, y0 = point1
     x1, y1 = point2
+    if x0 == x1: return None
     m = (y1 - y0)/(x1 - x0)
     b = y0 - m * x0
     return (m,b)
 
 '''
 Finds the intersection point between to line segments, returning None if none exist
+Segments that touch at an endpoint intersect there; vertical segments are allowed
 '''
 def intersection_of_segments(line1_point1, line1_point2, line2_point1, line2_point2):
-    line1 = convert_to_slope_intercept(line1_point1, line1_point2)
-    line2 = convert_to_slope_intercept(line2_point1, line2_point2)
-    possible_intersection = intersection_points([line1, line2])
-    if len(possible_intersection) == 0: return None
-    
-    x, y = possible_intersection[0]
-    if (line1_point1[0] < x and x < line1_point2[0] and
-        line2_point1[0] < x and x < line2_point2[0]):
-        return (x,y)
-    else:
-        return None
+    return segment_intersection(line1_point1, line1_point2, line2_point1, line2_point2)
 
 '''
 Returns a list (x, y) of intersection points between a list of lines (slope, intercept)
+Each pair of lines is counted once, and parallel lines are skipped
 '''
+@_stage
 def intersection_points(lines):
     x_list = []
     y_list = []
     for i in range(len(lines)):
-        for j in range(len(lines)):
-            if i == j: continue
+        for j in range(i + 1, len(lines)):
             m_1, b_1 = lines[i]
             m_2, b_2 = lines[j]
+            if m_1 == m_2: continue
             intersection_x = (b_2 - b_1)/(m_1 - m_2)
             intersection_y = m_1 * intersection_x + b_1
             x_list.append(intersection_x)
@@ -310,16 +1012,314 @@ def intersection_points(lines):
     intersections = [(x, y) for x, y in zip(x_list, y_list)]
     return intersections
 
+'''
+Finds the bounding box of all intersection points between a list of lines
+without computing every pair, in O(n log n)
+Input: list of lines (slope, intercept), or any lines accepted by duality2_linesToPoints
+       (vertical lines in a LineSet are left out)
+Returns: (min_x, max_x, min_y, max_y), or None if no two lines intersect
+Note:
+  Left of every vertex, the lines are ordered by slope (ties broken by intercept),
+  and the leftmost vertex is where two lines adjacent in that order first cross.
+  The same holds for the rightmost vertex, and for the lowest/highest vertex after
+  swapping the roles of x and y
+'''
+@_stage
+def arrangement_bounds(lines):
+    if isinstance(lines, LineSet):
+        lines = lines.array
+    if isinstance(lines, np.ndarray) and lines.dtype.names is not None:
+        lines = lines[lines['orientation'] != 0]
+    slope, intercept = _line_columns(lines)
+    x_bounds = _extreme_vertex_x(slope, intercept)
+    if x_bounds is None: return None
+
+    # With x and y swapped, the line y = mx + b becomes x = y/m - b/m,
+    # and each horizontal line y = b meets every other line at height b
+    horizontal = (slope == 0)
+    with np.errstate(divide = 'ignore'):
+        y_candidates = [_extreme_vertex_x(1/slope[~horizontal], -intercept[~horizontal]/slope[~horizontal])]
+    if horizontal.any() and not horizontal.all():
+        y_candidates.append((intercept[horizontal].min(), intercept[horizontal].max()))
+    y_candidates = [bounds for bounds in y_candidates if bounds is not None]
+    min_y = min(bounds[0] for bounds in y_candidates)
+    max_y = max(bounds[1] for bounds in y_candidates)
+    return x_bounds[0], x_bounds[1], min_y, max_y
+
+'''
+Returns (min_x, max_x) over the intersection points of lines (slope, intercept)
+given as arrays, or None if no two lines intersect
+'''
+def _extreme_vertex_x(slope, intercept):
+    x_list = []
+    # Order of the lines far to the left and (reversed) far to the right
+    for order in (np.lexsort((-intercept, slope)), np.lexsort((intercept, slope))):
+        m_1, b_1 = slope[order[:-1]], intercept[order[:-1]]
+        m_2, b_2 = slope[order[1:]], intercept[order[1:]]
+        crossing = (m_1 != m_2)
+        x_list.append((b_2[crossing] - b_1[crossing])/(m_1[crossing] - m_2[crossing]))
+    x_list = np.concatenate(x_list)
+    if len(x_list) == 0: return None
+    return x_list.min(), x_list.max()
+
 #####################################################
 ### Translate into language of  disk intersection ###
 #####################################################
 
+# Segments no longer than this relative to their coordinates have no arc (see negligible_segments).
+# Crossings of nearly parallel lines carry rounding errors of many ulps, seen up to about 1e-12
+SEGMENT_ROUNDING = 1e-9
+
 '''
-Input: a list of (x,y) points defining a halfplane intersection
-Returns: a list of (x, y, r, theta0, theta1) arcs
+Input: a PointSet (or list) of (x,y) points defining a halfplane intersection
+Returns: an ArcChain of (x, y, r, theta0, theta1) arcs
+         (negligible segments, such as repeated points, add no arc)
 '''
+@_stage
 def disk_intersection(halfplane_intersection):
-    x_points, y_points = zip(*halfplane_intersection)
-    segments = [((x_points[i], y_points[i]), (x_points[i+1], y_points[i+1])) for i in range(len(x_points) - 1)]
-    arcs = [inverseDuality1_segmentToArc(point1, point2) for point1, point2 in segments]
-    return arcs
\ No newline at end of file
+    points = PointSet(halfplane_intersection).array
+    negligible = negligible_segments(points[:-1], points[1:])
+    if negligible.any():
+        points = points[np.append(True, ~negligible)]
+    return ArcChain(inverseDuality1_segmentsToArcs(points[:-1], points[1:]))
+
+'''
+Finds the segments of a halfplane intersection that are zero-length up to rounding:
+repeated points, such as a crossing found exactly at a vertex, or the crossings of
+several lines through one point, found apart by rounding. Such a segment lies on no
+dual line, and its arc would be on a circle of the wrong or infinite radius
+Input: two array-likes of shape (N, 2); row i of each gives the endpoints of segment i
+Returns: boolean array of shape (N,)
+'''
+def negligible_segments(points1, points2):
+    points1 = np.asarray(points1, dtype = np.float64).reshape(-1, 2)
+    points2 = np.asarray(points2, dtype = np.float64).reshape(-1, 2)
+    scale = np.maximum(np.abs(points1).max(axis = 1, initial = 0), np.abs(points2).max(axis = 1, initial = 0))
+    return np.all(np.abs(points2 - points1) <= SEGMENT_ROUNDING * scale[:, None], axis = 1)
+
+############################################
+### Solve the full problem without plots ###
+############################################
+
+'''
+Finds the intersection of disks that all pass through the origin, applying
+the same sequence of transforms as the visualization but with no plotting
+Input: array-like of shape (N, 2) of circle centers (x, y)
+       hull_method: 'sweep' or 'chan', as for convex_hull
+Returns: an ArcChain of (x, y, r, theta0, theta1) arcs bounding the intersection region
+         (empty if the region is empty)
+'''
+@_stage
+def solve_disk_intersection(centers, hull_method = 'sweep'):
+    lines = duality1_circlesToLines(centers)
+    upper_hull, lower_hull = line_hulls(lines, hull_method)
+    return hull_intersection_arcs(upper_hull, lower_hull, vertical_bounds(lines))
+
+'''
+Splits the dual points of the disks by orientation and finds their hulls
+Input: array-like of shape (N, 2) of circle centers (x, y)
+Returns: (upper_hull, lower_hull), arrays of shape (h, 2) sorted by increasing x-coordinate
+         (disks centered on the x-axis are left out, see vertical_bounds)
+'''
+@_stage
+def disk_hulls(centers):
+    return line_hulls(duality1_circlesToLines(centers))
+
+'''
+disk_hulls for lines already returned by duality1_circlesToLines
+'''
+def line_hulls(lines, hull_method = 'sweep'):
+    hulls = []
+    for hull_type, orientation in (('upper', 1), ('lower', -1)):
+        points = duality2_linesToPoints(lines[lines['orientation'] == orientation])
+        hulls.append(convex_hull(points, hull_type, hull_method))
+    return tuple(hulls)
+
+'''
+Translates the upper and lower hulls back into the arcs bounding the intersection of disks
+Input: upper_hull, lower_hull as returned by disk_hulls (either may be empty)
+       x_bounds: (lower, upper) as returned by vertical_bounds, or None
+Returns: an ArcChain of (x, y, r, theta0, theta1) arcs (empty if the region is empty)
+'''
+@_stage
+def hull_intersection_arcs(upper_hull, lower_hull, x_bounds = None):
+    edges = hull_intersection_edges(upper_hull, lower_hull, x_bounds)
+    if len(edges) == 0: return ArcChain()
+    return disk_intersection(edges)
+
+'''
+Translates the upper and lower hulls into the merged halfplane intersection
+Input: upper_hull, lower_hull as returned by disk_hulls (either may be empty)
+       x_bounds: (lower, upper) as returned by vertical_bounds, or None
+Returns: a PointSet of points (x, y) as returned by merge_halfplanes
+         (clipped by clip_halfplanes if x_bounds is given)
+'''
+@_stage
+def hull_intersection_edges(upper_hull, lower_hull, x_bounds = None):
+    if len(upper_hull) == 0 and len(lower_hull) == 0:
+        return clip_halfplanes(None, x_bounds) if x_bounds is not None else PointSet()
+    upper_envelope = halfplane_envelope(upper_hull, 'upper') if len(upper_hull) > 0 else None
+    lower_envelope = halfplane_envelope(lower_hull, 'lower') if len(lower_hull) > 0 else None
+    edges = merge_halfplanes(upper_envelope, lower_envelope)
+    if x_bounds is None or len(edges) == 0: return edges
+    return clip_halfplanes(edges, x_bounds)
+
+# Distance along a vertical line to the point that stands in for infinity
+VERTICAL_PROXY = 1000
+
+'''
+Intersects a merged halfplane intersection with the vertical halfplanes of x_bounds
+Input:
+- edges: PointSet of points (x, y) as returned by merge_halfplanes, or None for the whole plane
+- x_bounds: (lower, upper) as returned by vertical_bounds
+Returns: a PointSet of points (x, y) in the same form (clockwise around the region, from
+         infinity to infinity), which is empty if the region is empty or the whole plane
+         If the clipped region is bounded, the first and last points are equal
+Note:
+  The path is the boundary of a convex region, so it leaves and enters a halfplane
+  at most once each. Where it is outside, the new boundary runs along the vertical
+  line instead, ending VERTICAL_PROXY away from the path if it goes to infinity
+'''
+@_stage
+def clip_halfplanes(edges, x_bounds):
+    lower, upper = x_bounds
+    if lower >= upper: return PointSet()
+    if lower == -np.inf and upper == np.inf: return PointSet(() if edges is None else edges)
+
+    # Lower and upper bounds have opposite signs, so at most one is finite here
+    x_clip, keep_right = (lower, True) if lower > -np.inf else (upper, False)
+    # Moving along the line with the region on the right goes up for x >= x_clip
+    direction = VERTICAL_PROXY if keep_right else -VERTICAL_PROXY
+    if edges is None:
+        return PointSet([(x_clip, -direction), (x_clip, direction)])
+
+    edges = PointSet(edges).tolist()
+    inside = lambda point: (point[0] >= x_clip) if keep_right else (point[0] <= x_clip)
+    runs = []
+    for i in range(len(edges)):
+        p = edges[i]
+        p_in = inside(p)
+        if i > 0 and p_in != q_in:
+            t = (x_clip - q[0])/(p[0] - q[0])
+            crossing = (x_clip, q[1] + t * (p[1] - q[1]))
+            if p_in: runs.append([crossing])
+            else: runs[-1].append(crossing)
+        elif i == 0 and p_in:
+            runs.append([])
+        if p_in: runs[-1].append(p)
+        q, q_in = p, p_in
+
+    if len(runs) == 0: return PointSet()
+    path = [point for run in runs for point in run]
+    starts_inside, ends_inside = inside(edges[0]), inside(edges[-1])
+    if not starts_inside and not ends_inside:
+        # Entered and left again: the vertical line closes the region
+        return PointSet(path + [path[0]] if len(set(path)) > 1 else ())
+    if not starts_inside:
+        path.insert(0, (x_clip, path[0][1] - direction))
+    if not ends_inside:
+        path.append((x_clip, path[-1][1] + direction))
+    return PointSet(path)
+
+#####################################
+### Query the intersection region ###
+#####################################
+
+'''
+IntersectionQuery
+    Answers membership queries for the intersection of disks, plus its area and perimeter
+    A point p != (0, 0) lies in a disk through the origin if and only if its inversion
+    p / |p|^2 lies in the dual halfplane of the disk, so each query becomes a check of
+    the upper envelope (from below) and the lower envelope (from above) at one x-coordinate.
+    Each envelope is found by binary search over its x-sorted vertices, for O(log n) per point
+Input: upper_hull, lower_hull as returned by disk_hulls
+       x_bounds: (lower, upper) as returned by vertical_bounds, or None
+Usage:
+  contains(points) takes an array of shape (N, 2) and returns a boolean array of shape (N,)
+  area, perimeter, arcs and edges describe the region, computed once from the
+  merged envelope and the disk_intersection arcs
+'''
+class IntersectionQuery:
+    def __init__(self, upper_hull, lower_hull, x_bounds = None):
+        upper_hull = np.asarray(upper_hull, dtype = np.float64).reshape(-1, 2)
+        lower_hull = np.asarray(lower_hull, dtype = np.float64).reshape(-1, 2)
+
+        # Upper envelope lines run right to left along the hull, so reverse them
+        self._upper = _envelope_lines(upper_hull[::-1])
+        self._lower = _envelope_lines(lower_hull)
+        self._x_bounds = x_bounds
+
+        self.edges = hull_intersection_edges(upper_hull, lower_hull, x_bounds)
+        self.arcs = disk_intersection(self.edges) if len(self.edges) > 0 else ArcChain()
+        self.area, self.perimeter = arcs_area_perimeter(self.arcs)
+
+    @classmethod
+    def from_centers(cls, centers):
+        lines = duality1_circlesToLines(centers)
+        return cls(*line_hulls(lines), vertical_bounds(lines))
+
+    @_stage
+    def contains(self, points):
+        points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+        norm = points[:, 0] ** 2 + points[:, 1] ** 2
+        at_origin = (norm == 0)
+        norm[at_origin] = 1
+        dual_x, dual_y = points[:, 0]/norm, points[:, 1]/norm
+
+        inside = np.ones(len(points), dtype = bool)
+        if self._upper is not None:
+            inside &= (dual_y >= _evaluate_envelope(self._upper, dual_x))
+        if self._lower is not None:
+            inside &= (dual_y <= _evaluate_envelope(self._lower, dual_x))
+        if self._x_bounds is not None:
+            inside &= (dual_x >= self._x_bounds[0]) & (dual_x <= self._x_bounds[1])
+
+        # Every disk passes through the origin
+        inside[at_origin] = True
+        return inside
+
+'''
+Returns (breakpoints, slopes, intercepts) for an envelope whose lines come from
+'hull' in order of increasing x along the envelope, or None if the hull is empty
+'''
+def _envelope_lines(hull):
+    if len(hull) == 0: return None
+    lines = inverseDuality2_pointsToLines(hull)
+    slope, intercept = lines[:, 0], lines[:, 1]
+    breakpoints = (intercept[1:] - intercept[:-1])/(slope[:-1] - slope[1:])
+    return breakpoints, slope, intercept
+
+'''
+Evaluates an envelope from _envelope_lines at each x-coordinate in 'x'
+'''
+def _evaluate_envelope(envelope, x):
+    breakpoints, slope, intercept = envelope
+    line = np.searchsorted(breakpoints, x)
+    return slope[line] * x + intercept[line]
+
+'''
+Finds the area and perimeter of the region bounded by a chain of arcs from disk_intersection
+The chain ends next to the origin where it started, and is closed with a straight segment
+Returns: (area, perimeter), or (0, 0) for an empty chain
+'''
+@_stage
+def arcs_area_perimeter(arcs):
+    if len(arcs) == 0: return 0.0, 0.0
+    x, y, r, theta0, theta1 = np.asarray(arcs, dtype = np.float64).T
+    theta0, theta1 = np.radians(theta0), np.radians(theta1)
+
+    # Arcs run counterclockwise from theta0 to theta1
+    sweep = np.mod(theta1 - theta0, 2 * np.pi)
+    theta1 = theta0 + sweep
+
+    # Green's theorem: area = 1/2 * integral of (x dy - y dx) around the boundary
+    twice_area = np.sum(r ** 2 * sweep + x * r * (np.sin(theta1) - np.sin(theta0))
+                        - y * r * (np.cos(theta1) - np.cos(theta0)))
+    perimeter = np.sum(r * sweep)
+
+    # Closing segment from the end of the last arc to the start of the first
+    end_x, end_y = x[-1] + r[-1] * np.cos(theta1[-1]), y[-1] + r[-1] * np.sin(theta1[-1])
+    start_x, start_y = x[0] + r[0] * np.cos(theta0[0]), y[0] + r[0] * np.sin(theta0[0])
+    twice_area += end_x * start_y - start_x * end_y
+    perimeter += np.hypot(start_x - end_x, start_y - end_y)
+    return float(twice_area / 2), float(perimeter)
@@ -0,0 +1,332 @@
+import numpy as np
+import bisect
+import collections
+
+from duality_computation import (duality1_circleToLine, duality1_circlesToLines, duality2_lineToPoint,
+                                 hull_intersection_arcs, vertical_bounds)
+from predicates import cross2d, orient2d
+
+'''
+A set of disks through the origin that supports inserting and deleting disks,
+and answers "current intersection region" queries without recomputing from scratch
+
+The dual points of each orientation are kept in a DynamicUpperHull, a balanced
+binary tree in the style of Overmars and van Leeuwen: the leaves hold the points
+in x order, and every internal node stores the bridge (upper common tangent)
+between the hulls of its two subtrees. The hull of a subtree is never stored;
+it is the left subtree's hull up to the bridge followed by the right subtree's
+hull from the bridge on, so it can be searched by walking down the tree.
+
+Updates cost O(log^3 n) amortized (O(log n) bridges, each found by nested
+O(log n) descents), and a query costs O(h log n) for a hull of h points
+'''
+
+# A subtree is rebuilt when one of its children holds less than this fraction of its leaves
+BALANCE = 0.25
+
+####################################
+####  Dynamic upper convex hull  ####
+####################################
+
+class _Node:
+    __slots__ = ('left', 'right', 'x', 'y', 'size', 'min_x', 'max_x', 'bridge')
+
+    def __init__(self, left = None, right = None, x = None, y = None):
+        self.left, self.right = left, right
+        self.x, self.y = x, y
+        if left is None:
+            self.size = 1
+            self.min_x = self.max_x = x
+            self.bridge = None
+        else:
+            _update(self)
+
+'''
+DynamicUpperHull
+    Upper convex hull of a multiset of points under insertions and deletions
+    Among points that share an x-coordinate, only the highest is on the hull.
+    Collinear points are not reported as hull vertices
+'''
+class DynamicUpperHull:
+    def __init__(self, points = ()):
+        self._ys = {}   # x -> sorted list of the y-coordinates of all points with that x
+        for x, y in points:
+            self._add_y(float(x), float(y))
+        self._root = _build([_Node(x = x, y = ys[-1]) for x, ys in sorted(self._ys.items())])
+        self._count = sum(len(ys) for ys in self._ys.values())
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, point):
+        ys = self._ys.get(float(point[0]))
+        return ys is not None and float(point[1]) in ys
+
+    def insert(self, point):
+        x, y = float(point[0]), float(point[1])
+        ys = self._ys.get(x)
+        self._add_y(x, y)
+        self._count += 1
+        if ys is None:
+            self._root = _insert(self._root, x, y)
+        elif ys[-1] == y and (len(ys) < 2 or ys[-2] < y):
+            _set_y(self._root, x, y)
+
+    def delete(self, point):
+        x, y = float(point[0]), float(point[1])
+        ys = self._ys.get(x)
+        if ys is None or y not in ys:
+            raise KeyError(point)
+
+        old_max = ys[-1]
+        ys.remove(y)
+        self._count -= 1
+        if len(ys) == 0:
+            del self._ys[x]
+            self._root = _delete(self._root, x)
+        elif ys[-1] != old_max:
+            _set_y(self._root, x, ys[-1])
+
+    '''
+    Returns the hull as an array of shape (h, 2) sorted by increasing x-coordinate
+    '''
+    def hull(self):
+        hull = []
+        if self._root is not None:
+            _collect(self._root, -np.inf, np.inf, hull)
+        return np.array(hull, dtype = np.float64).reshape(-1, 2)
+
+    def _add_y(self, x, y):
+        bisect.insort(self._ys.setdefault(x, []), y)
+
+## Tree maintenance ##
+
+def _update(node):
+    left, right = node.left, node.right
+    node.size = left.size + right.size
+    node.min_x, node.max_x = left.min_x, right.max_x
+    node.bridge = _find_bridge(left, right)
+
+def _unbalanced(node):
+    return node.left is not None and min(node.left.size, node.right.size) < BALANCE * node.size
+
+def _build(leaves):
+    if len(leaves) == 0: return None
+    if len(leaves) == 1: return leaves[0]
+    middle = len(leaves) // 2
+    return _Node(_build(leaves[:middle]), _build(leaves[middle:]))
+
+def _leaves(node, out):
+    if node.left is None:
+        out.append(node)
+    else:
+        _leaves(node.left, out)
+        _leaves(node.right, out)
+    return out
+
+def _insert(node, x, y):
+    if node is None:
+        return _Node(x = x, y = y)
+    if node.left is None:
+        leaf = _Node(x = x, y = y)
+        return _Node(leaf, node) if x < node.x else _Node(node, leaf)
+
+    if x <= node.left.max_x:
+        node.left = _insert(node.left, x, y)
+    else:
+        node.right = _insert(node.right, x, y)
+    _update(node)
+    return _build(_leaves(node, [])) if _unbalanced(node) else node
+
+def _delete(node, x):
+    if node.left is None:
+        return None
+
+    if x <= node.left.max_x:
+        node.left = _delete(node.left, x)
+    else:
+        node.right = _delete(node.right, x)
+    if node.left is None: return node.right
+    if node.right is None: return node.left
+    _update(node)
+    return _build(_leaves(node, [])) if _unbalanced(node) else node
+
+def _set_y(node, x, y):
+    if node.left is None:
+        node.y = y
+        return
+    _set_y(node.left if x <= node.left.max_x else node.right, x, y)
+    node.bridge = _find_bridge(node.left, node.right)
+
+## Searching the implicit hulls ##
+
+'''
+Appends to 'out' the hull vertices of the subtree 'node' with x-coordinate in [lo, hi]
+lo and hi are always infinite or the x-coordinates of hull vertices of 'node'
+'''
+def _collect(node, lo, hi, out):
+    while node.left is not None:
+        px, py, qx, qy = node.bridge
+        if px < lo:
+            node = node.right
+        elif qx > hi:
+            node = node.left
+        else:
+            _collect(node.left, lo, px, out)
+            node, lo = node.right, qx
+    out.append((node.x, node.y))
+
+'''
+Finds the hull vertex of the subtree 'node' that is highest in the direction
+perpendicular to a -> b, ie. that maximizes (b - a) x (point - a) (with a left of b)
+'''
+def _extreme(node, a, b):
+    lo, hi = -np.inf, np.inf
+    while node.left is not None:
+        px, py, qx, qy = node.bridge
+        if px < lo:
+            node = node.right
+        elif qx > hi:
+            node = node.left
+        elif cross2d(a, b, (px, py), (qx, qy)) >= 0:
+            node, lo = node.right, qx
+        else:
+            node, hi = node.left, px
+    return node.x, node.y
+
+'''
+Finds the bridge (px, py, qx, qy) between the upper hulls of two subtrees,
+where every point of 'left' is to the left of every point of 'right'
+'''
+def _find_bridge(left, right):
+    # Bridge point on the left hull: an edge (p, q) of the left hull lies before it
+    # if and only if the whole right hull is strictly below the line through p and q
+    node, lo, hi = left, -np.inf, np.inf
+    while node.left is not None:
+        px, py, qx, qy = node.bridge
+        if px < lo:
+            node = node.right
+        elif qx > hi:
+            node = node.left
+        else:
+            if orient2d((px, py), (qx, qy), _extreme(right, (px, py), (qx, qy))) < 0:
+                node, lo = node.right, qx
+            else:
+                node, hi = node.left, px
+    ax, ay = node.x, node.y
+
+    # Bridge point on the right hull: the tangent from (ax, ay)
+    node, lo, hi = right, -np.inf, np.inf
+    while node.left is not None:
+        px, py, qx, qy = node.bridge
+        if px < lo:
+            node = node.right
+        elif qx > hi:
+            node = node.left
+        elif orient2d((px, py), (qx, qy), (ax, ay)) < 0:
+            node, hi = node.left, px
+        else:
+            node, lo = node.right, qx
+    return (ax, ay, node.x, node.y)
+
+###########################################
+####  Dynamic set of disks and queries ####
+###########################################
+
+'''
+DynamicDiskSet
+    A multiset of disks through the origin, given by their centers (x, y)
+Usage:
+  insert(center) / delete(center) add or remove one disk
+  intersection() returns the arcs (x, y, r, theta0, theta1) bounding the current
+  intersection region, like solve_disk_intersection on the current centers
+'''
+class DynamicDiskSet:
+    def __init__(self, centers = ()):
+        upper_points, lower_points = [], []
+        self._vertical = _VerticalLines()
+        for center in centers:
+            x, y, orientation = self._dual_point(center)
+            if orientation == 1:
+                upper_points.append((x, y))
+            elif orientation == -1:
+                lower_points.append((x, -y))
+            else:
+                self._vertical.insert(center)
+
+        # The lower hull is the upper hull of the points reflected over the x-axis
+        self._upper = DynamicUpperHull(upper_points)
+        self._lower = DynamicUpperHull(lower_points)
+
+    def __len__(self):
+        return len(self._upper) + len(self._lower) + len(self._vertical)
+
+    def __contains__(self, center):
+        hull, point = self._side(center)
+        return point in hull
+
+    def insert(self, center):
+        hull, point = self._side(center)
+        hull.insert(point)
+
+    def delete(self, center):
+        hull, point = self._side(center)
+        if point not in hull:
+            raise KeyError(center)
+        hull.delete(point)
+
+    def upper_hull(self):
+        return self._upper.hull()
+
+    def lower_hull(self):
+        hull = self._lower.hull()
+        hull[:, 1] *= -1
+        return hull
+
+    def intersection(self):
+        return hull_intersection_arcs(self.upper_hull(), self.lower_hull(), self._vertical.bounds())
+
+    def _side(self, center):
+        x, y, orientation = self._dual_point(center)
+        if orientation == 1:
+            return self._upper, (x, y)
+        if orientation == -1:
+            return self._lower, (x, -y)
+        return self._vertical, center
+
+    @staticmethod
+    def _dual_point(center):
+        line = duality1_circleToLine(center)
+        x, y = duality2_lineToPoint(line)
+        return x, y, line[2]
+
+'''
+Multiset of the disks centered on the x-axis, whose dual lines are vertical
+and are kept out of the hulls (see vertical_bounds in duality_computation.py)
+'''
+class _VerticalLines:
+    def __init__(self):
+        self._centers = collections.Counter()
+
+    def __len__(self):
+        return sum(self._centers.values())
+
+    def __contains__(self, center):
+        return self._centers[_key(center)] > 0
+
+    def insert(self, center):
+        self._centers[_key(center)] += 1
+
+    def delete(self, center):
+        key = _key(center)
+        if self._centers[key] == 0:
+            raise KeyError(center)
+        self._centers[key] -= 1
+        if self._centers[key] == 0:
+            del self._centers[key]
+
+    def bounds(self):
+        return vertical_bounds(duality1_circlesToLines(list(self._centers)))
+
+def _key(center):
+    return (float(center[0]), float(center[1]))
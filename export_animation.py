@@ -0,0 +1,360 @@
+import numpy as np
+import argparse
+import concurrent.futures
+import os
+import shutil
+import subprocess
+import tempfile
+
+import matplotlib
+import matplotlib.image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from duality_computation import (arrangement_bounds, disk_intersection, duality1_circlesToLines,
+                                 duality2_linesToPoints, halfplane_envelope, hull_intersection_edges,
+                                 sort_for_hull, vertical_bounds)
+from batch_solve import read_instances
+from sweep_trace import record_trace
+from visualization import halfplane_polygons, padded_limits, sweep_frames
+
+'''
+Offscreen export of the sweep animation: renders the same sequence of frames as
+visualization.py (upper hull sweep, lower hull sweep, merged solution) for a given
+set of disk centers, without a window, into an MP4, a GIF or a PNG sequence
+
+The sweeps are first recorded as traces (see sweep_trace.py) and the animation as
+a list of small per-frame states (the sweepline position and the step of the sweep);
+the frames are then drawn with the Agg backend in parallel worker processes, each
+of which replays the traces over its own range of consecutive frames
+
+Output formats:
+- 'mp4': needs ffmpeg on the PATH
+- 'gif': needs Pillow
+- 'png': a directory of frame_00000.png, frame_00001.png, ...
+'''
+
+FRAME_NAME = 'frame_%05d.png'
+ARC_SAMPLES = 64
+
+#################################
+######  Record the frames  ######
+#################################
+
+'''
+Scene
+    The parts of the animation that do not change from frame to frame
+Attributes:
+- centers: array of shape (N, 2) of circle centers
+- lines: LineSet of the dual lines of the circles
+- points: {'upper': ..., 'lower': ...}, the dual points of each hull as returned by sort_for_hull
+- traces: {'upper': ..., 'lower': ...}, the SweepTrace of each hull
+- circle_limits, halfplane_limits, hull_limits: (min_x, max_x, min_y, max_y) of each axis
+  (hull_limits has one entry per hull type)
+'''
+class Scene:
+    def __init__(self, centers):
+        self.centers = np.asarray(centers, dtype = np.float64).reshape(-1, 2)
+        self.lines = duality1_circlesToLines(self.centers)
+        self.points = {}
+        self.traces = {}
+        self.hull_limits = {}
+        for hull_type, orientation in (('upper', 1), ('lower', -1)):
+            points = duality2_linesToPoints(self.lines[self.lines['orientation'] == orientation])
+            self.points[hull_type] = sort_for_hull(points, hull_type)
+            self.traces[hull_type] = record_trace(self.points[hull_type], hull_type)
+            self.hull_limits[hull_type] = padded_limits(self.points[hull_type])
+
+        radii = np.hypot(self.centers[:, 0], self.centers[:, 1])
+        extent = max(np.max(np.abs(self.centers) + radii[:, None]), 1) if len(self.centers) > 0 else 3
+        self.circle_limits = (-extent, extent, -extent, extent)
+
+        bounds = arrangement_bounds(self.lines) if len(self.lines) >= 2 else None
+        # Corners (min_x, min_y) and (max_x, max_y) of the bounding box of the line intersections
+        self.halfplane_limits = padded_limits(None if bounds is None else np.array([bounds[0::2], bounds[1::2]]))
+
+'''
+Records the frames of the animation
+Input:
+- scene: Scene of the instance
+- max_frames: the most frames to draw for each hull sweep
+- hold_frames: number of times the last frame of each stage is repeated
+Returns: a list of frames (hull_type, sweep_x, num_ready, merged), where num_ready is
+         the step of scene.traces[hull_type] and merged is True for the final solution
+'''
+def record_frames(scene, max_frames = 100, hold_frames = 30):
+    frames = []
+    for hull_type in ('upper', 'lower'):
+        min_x, max_x = scene.hull_limits[hull_type][:2]
+        frames.append((hull_type, min_x, 0, False))
+        for x, num_ready in sweep_frames(scene.points[hull_type][:, 0].tolist(), min_x, max_x, max_frames):
+            frames.append((hull_type, x, num_ready, False))
+        frames.extend([frames[-1]] * hold_frames)
+
+    hull_type, x, num_ready, _ = frames[-1]
+    frames.extend([(hull_type, x, num_ready, True)] * (hold_frames + 1))
+    return frames
+
+################################
+######  Render the frames  #####
+################################
+
+'''
+FrameRenderer
+    An offscreen (Agg) copy of the figure of visualization.py that draws recorded frames
+    As in BlitRenderer, each frame only draws the animated artists on top of a cached
+    image of the static ones (axes, input circles, shaded halfplanes). That image can
+    be drawn once with background_image() and handed to other renderers, which then
+    show it instead of drawing the static artists themselves
+Input:
+- scene: Scene of the instance
+- dpi: resolution of the frames
+- background: an image from background_image() of a renderer of the same scene, or None
+Usage:
+  render(frame, path) draws one frame from record_frames and saves it as a PNG
+'''
+class FrameRenderer:
+    def __init__(self, scene, dpi = 100, background = None):
+        self.scene = scene
+        self._edges = None
+        self._background = None
+        self._cursors = {hull_type: trace.cursor() for hull_type, trace in scene.traces.items()}
+        self.fig = Figure(figsize = (14,4), dpi = dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.circle_ax, self.halfplane_ax, self.hull_ax = self.fig.subplots(nrows = 1, ncols = 3)
+        for ax in self.fig.axes:
+            ax.xaxis.set_visible(False)
+            ax.yaxis.set_visible(False)
+        self.circle_ax.set_xlim(*scene.circle_limits[:2])
+        self.circle_ax.set_ylim(*scene.circle_limits[2:])
+        self.halfplane_ax.set_xlim(*scene.halfplane_limits[:2])
+        self.halfplane_ax.set_ylim(*scene.halfplane_limits[2:])
+
+        if background is None:
+            self._draw_static()
+        else:
+            self.fig.figimage(background)
+            for ax in self.fig.axes:
+                ax.set_axis_off()
+
+        self.arcs_plt = self.circle_ax.add_collection(matplotlib.collections.LineCollection([], lw = 3))
+        self.emph_lines_plt, = self.halfplane_ax.plot([], [], c = 'b', lw = 3, zorder = 3)
+        self.points_plt = self.hull_ax.scatter([], [])
+        self.hull_plt, = self.hull_ax.plot([], [])
+        self.sweepline = self.hull_ax.axvline(ymax = 0)
+
+        self._artists = [self.arcs_plt, self.emph_lines_plt, self.points_plt, self.hull_plt, self.sweepline]
+        for artist in self._artists:
+            artist.set_animated(True)
+
+    '''
+    Returns the static artists drawn as an RGBA array of shape (height, width, 4)
+    '''
+    def background_image(self):
+        self.canvas.draw()
+        return np.array(self.canvas.buffer_rgba())
+
+    def render(self, frame, path):
+        hull_type, x, num_ready, merged = frame
+        points = self.scene.points[hull_type]
+        hull, _, _ = self._cursors[hull_type].seek(num_ready)
+        if self._background is None:
+            self.canvas.draw()
+            self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.canvas.restore_region(self._background)
+
+        # Convex hull subplot
+        min_x, max_x, min_y, max_y = self.scene.hull_limits[hull_type]
+        self.hull_ax.set_xlim(min_x, max_x)
+        self.hull_ax.set_ylim(min_y, max_y)
+        self.points_plt.set_offsets(points)
+        self.points_plt.set_sizes(np.where(np.arange(len(points)) < num_ready, 70, 30))
+        self.hull_plt.set_data(hull[:, 0], hull[:, 1])
+        self.sweepline.set_data([x, x], [0, 1])
+
+        # Halfplane and circle subplots
+        if merged:
+            edges = self._merged_edges()
+            self.emph_lines_plt.set_data(*_columns(edges))
+            self.emph_lines_plt.set_color('g')
+            self._draw_arcs(edges, 'g')
+        elif len(hull) > 0:
+            envelope = halfplane_envelope(hull, hull_type)
+            color = 'b' if hull_type == 'upper' else 'r'
+            self.emph_lines_plt.set_data(*_columns(envelope))
+            self.emph_lines_plt.set_color(color)
+            self._draw_arcs(envelope, color)
+        else:
+            self.emph_lines_plt.set_data([], [])
+            self._draw_arcs([], 'b')
+
+        for artist in self._artists:
+            artist.axes.draw_artist(artist)
+        matplotlib.image.imsave(path, np.asarray(self.canvas.buffer_rgba()))
+
+    def _merged_edges(self):
+        if self._edges is None:
+            hulls = [self.scene.traces[hull_type].cursor(len(self.scene.points[hull_type])).hull
+                     for hull_type in ('upper', 'lower')]
+            self._edges = hull_intersection_edges(*hulls, vertical_bounds(self.scene.lines))
+        return self._edges
+
+    '''
+    Draws the arcs of a halfplane intersection as polylines of ARC_SAMPLES points each
+    '''
+    def _draw_arcs(self, halfplane_intersection, color):
+        if len(halfplane_intersection) < 2:
+            self.arcs_plt.set_segments([])
+            return
+        x, y, r, theta0, theta1 = np.array(disk_intersection(halfplane_intersection)).T[:, :, None]
+        # Arcs run counterclockwise from theta0 to theta1
+        theta = np.radians(theta0 + np.mod(theta1 - theta0, 360) * np.linspace(0, 1, ARC_SAMPLES))
+        self.arcs_plt.set_segments(np.stack([x + r * np.cos(theta), y + r * np.sin(theta)], axis = -1))
+        self.arcs_plt.set_color(color)
+
+    def _draw_static(self):
+        self.circle_ax.scatter([0], [0])
+        diameters = 2 * np.hypot(self.scene.centers[:, 0], self.scene.centers[:, 1])
+        self.circle_ax.add_collection(matplotlib.collections.EllipseCollection(
+            diameters, diameters, np.zeros(len(diameters)), units = 'xy', offsets = self.scene.centers,
+            offset_transform = self.circle_ax.transData, facecolors = 'none', edgecolors = 'k'))
+
+        segments, regions, colors = halfplane_polygons(self.scene.lines, self.scene.halfplane_limits)
+        self.halfplane_ax.add_collection(matplotlib.collections.PolyCollection(
+            regions, facecolors = colors, alpha = 0.05, edgecolors = 'none'))
+        self.halfplane_ax.add_collection(matplotlib.collections.LineCollection(segments, colors = colors))
+
+def _columns(points):
+    if len(points) == 0: return [], []
+    points = np.asarray(points, dtype = np.float64)
+    return points[:, 0], points[:, 1]
+
+'''
+Renders 'frames' into PNG files named FRAME_NAME in 'frame_dir', over a process pool
+The static part of the figure is drawn once here and shared with the workers,
+and a frame that repeats the one before it is copied rather than drawn again
+'''
+def render_frames(scene, frames, frame_dir, dpi = 100, workers = None):
+    global _renderer
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(frame_dir, exist_ok = True)
+    bounds = np.linspace(0, len(frames), min(workers * 4, len(frames)) + 1).astype(int).tolist()
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+
+    _renderer = FrameRenderer(scene, dpi)
+    if workers <= 1:
+        for start, stop in ranges:
+            _render_range(frames[start:stop], start, frame_dir)
+        return
+
+    background = _renderer.background_image()
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                                                initargs = (scene, dpi, background)) as executor:
+        futures = [executor.submit(_render_range, frames[start:stop], start, frame_dir) for start, stop in ranges]
+        for future in futures:
+            future.result()
+
+## Helper methods for the process pool ##
+
+_renderer = None
+
+def _init_worker(scene, dpi, background):
+    global _renderer
+    _renderer = FrameRenderer(scene, dpi, background)
+
+def _render_range(frames, first_index, frame_dir):
+    previous = None
+    for offset, frame in enumerate(frames):
+        path = os.path.join(frame_dir, FRAME_NAME % (first_index + offset))
+        if previous is not None and frame is frames[offset - 1]:
+            shutil.copyfile(previous, path)
+        else:
+            _renderer.render(frame, path)
+        previous = path
+
+#################################
+######  Write the animation  ####
+#################################
+
+'''
+Renders the animation of the instance 'centers' and writes it to 'destination'
+Input:
+- centers: array-like of shape (N, 2) of circle centers
+- destination: path of the .mp4 or .gif file, or of the directory for a PNG sequence
+- output_format: 'mp4', 'gif', 'png', or None to infer from the destination
+- fps: frames per second of the video
+- max_frames: the most frames to draw for each hull sweep
+- hold: seconds to hold the last frame of each stage
+- dpi: resolution of the frames
+- workers: number of worker processes (defaults to the number of CPUs)
+Returns: the number of frames written
+'''
+def export_animation(centers, destination, output_format = None, fps = 30, max_frames = 100,
+                     hold = 1.0, dpi = 100, workers = None):
+    if output_format is None:
+        output_format = os.path.splitext(destination)[1].lstrip('.').lower() or 'png'
+    if output_format not in ('mp4', 'gif', 'png'):
+        raise ValueError("Unknown output format '%s'" % output_format)
+    if output_format == 'mp4' and shutil.which('ffmpeg') is None:
+        raise RuntimeError('MP4 export needs ffmpeg on the PATH')
+
+    scene = Scene(centers)
+    frames = record_frames(scene, max_frames, int(round(hold * fps)))
+
+    if output_format == 'png':
+        render_frames(scene, frames, destination, dpi, workers)
+        return len(frames)
+
+    with tempfile.TemporaryDirectory() as frame_dir:
+        render_frames(scene, frames, frame_dir, dpi, workers)
+        if output_format == 'mp4':
+            _write_mp4(frame_dir, destination, fps)
+        else:
+            _write_gif(frame_dir, len(frames), destination, fps)
+    return len(frames)
+
+def _write_mp4(frame_dir, destination, fps):
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(fps),
+                    '-i', os.path.join(frame_dir, FRAME_NAME),
+                    # H.264 needs even frame dimensions
+                    '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', '-pix_fmt', 'yuv420p', destination], check = True)
+
+def _write_gif(frame_dir, num_frames, destination, fps):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError('GIF export needs Pillow')
+
+    paths = [os.path.join(frame_dir, FRAME_NAME % i) for i in range(num_frames)]
+    first = Image.open(paths[0])
+    rest = (Image.open(path) for path in paths[1:])
+    first.save(destination, save_all = True, append_images = rest, duration = 1000/fps, loop = 0)
+
+########################################
+#############  Main method  ############
+########################################
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Render the sweep animation for a file of disk centers without a window.')
+    parser.add_argument('input', help = 'CSV or NPY file of disk centers ("-" for CSV on stdin)')
+    parser.add_argument('output', help = '.mp4 or .gif file, or a directory for a PNG sequence')
+    parser.add_argument('--input-format', choices = ['csv', 'npy'], help = 'Override the format inferred from the input file name')
+    parser.add_argument('--format', choices = ['mp4', 'gif', 'png'], help = 'Override the format inferred from the output name')
+    parser.add_argument('--instance', type = int, default = 0, help = 'Which instance of the input to animate')
+    parser.add_argument('--fps', type = float, default = 30, help = 'Frames per second')
+    parser.add_argument('--max-frames', type = int, default = 100, help = 'Most frames per hull sweep')
+    parser.add_argument('--hold', type = float, default = 1.0, help = 'Seconds to hold the end of each stage')
+    parser.add_argument('--dpi', type = int, default = 100, help = 'Resolution of the frames')
+    parser.add_argument('-j', '--workers', type = int, help = 'Number of worker processes')
+    args = parser.parse_args(argv)
+
+    for index, centers in enumerate(read_instances(args.input, args.input_format)):
+        if index == args.instance: break
+    else:
+        parser.error('The input has no instance %d' % args.instance)
+
+    export_animation(centers, args.output, args.format, args.fps, args.max_frames, args.hold, args.dpi, args.workers)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import numpy as np
+
+'''
+Array-backed containers for the geometry passed between the stages of the pipeline
+
+Each container holds one contiguous array and hands out lightweight views of its
+rows, so that a stage can pass its result to the next without building a list of
+tuples. A row view behaves like the tuple it stands for (it can be unpacked, indexed,
+compared and hashed) but only holds the array and a row index. Slicing or masking a
+container gives another container of the same kind, and np.asarray() of a container
+returns its array without copying
+- PointSet: points (x, y), an array of shape (N, 2)
+- Envelope: the vertices of a halfplane envelope, a PointSet that knows its hull type
+- LineSet:  dual lines (slope, intercept, orientation), an array with dtype LINE_DTYPE
+- ArcChain: arcs (x, y, r, theta0, theta1), an array of shape (N, 5)
+'''
+
+'''
+Structured dtype for arrays of dual lines, one record per line
+(slope, intercept, orientation) as returned by duality1_circleToLine
+A circle centered on the x-axis has a vertical dual line x = c, stored with
+slope inf, orientation 0 and c in place of the intercept (see vertical_bounds)
+'''
+LINE_DTYPE = np.dtype([('slope', np.float64), ('intercept', np.float64), ('orientation', np.int8)])
+
+#################################
+########  Row views  ############
+#################################
+
+'''
+Base class of the row views: 'fields' names the values of a row, in order
+'''
+class _Row:
+    __slots__ = ('_rows', '_index')
+    fields = ()
+
+    def __init__(self, rows, index):
+        self._rows = rows
+        self._index = index
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __iter__(self):
+        return iter(self._rows[self._index].tolist())
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __eq__(self, other):
+        try:
+            return tuple(self) == tuple(other)
+        except TypeError:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join('%s=%r' % item for item in zip(self.fields, self)))
+
+class Point(_Row):
+    __slots__ = ()
+    fields = ('x', 'y')
+    x = property(lambda self: float(self._rows[self._index, 0]))
+    y = property(lambda self: float(self._rows[self._index, 1]))
+
+class Line(_Row):
+    __slots__ = ()
+    fields = ('slope', 'intercept', 'orientation')
+    slope = property(lambda self: float(self._rows['slope'][self._index]))
+    intercept = property(lambda self: float(self._rows['intercept'][self._index]))
+    orientation = property(lambda self: int(self._rows['orientation'][self._index]))
+
+class Arc(_Row):
+    __slots__ = ()
+    fields = ('x', 'y', 'r', 'theta0', 'theta1')
+    x = property(lambda self: float(self._rows[self._index, 0]))
+    y = property(lambda self: float(self._rows[self._index, 1]))
+    r = property(lambda self: float(self._rows[self._index, 2]))
+    theta0 = property(lambda self: float(self._rows[self._index, 3]))
+    theta1 = property(lambda self: float(self._rows[self._index, 4]))
+
+#################################
+########  Containers  ###########
+#################################
+
+'''
+Base class of the containers
+Subclasses set 'row' (the row view class) and implement _coerce(), which turns
+the constructor's input into the backing array
+'''
+class _Rows:
+    __slots__ = ('array',)
+    row = None
+
+    def __init__(self, rows = ()):
+        self.array = self._coerce(rows)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0: index += len(self.array)
+            if not 0 <= index < len(self.array):
+                raise IndexError('index out of range')
+            return self.row(self.array, int(index))
+        return self._wrap(self.array[index])
+
+    def __iter__(self):
+        array, row = self.array, self.row
+        return (row(array, i) for i in range(len(array)))
+
+    def __array__(self, dtype = None, copy = None):
+        if copy:
+            return self.array.astype(dtype or self.array.dtype)
+        return self.array if dtype is None else self.array.astype(dtype, copy = False)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.array)
+
+    '''
+    Returns the rows as a list of tuples
+    '''
+    def tolist(self):
+        return [tuple(row) for row in self.array.tolist()]
+
+    # A container of the same kind over 'array'
+    def _wrap(self, array):
+        return type(self)(array)
+
+'''
+PointSet
+    Points (x, y) backed by a float64 array of shape (N, 2)
+Attributes:
+- array: the backing array
+- x, y: views of its columns
+'''
+class PointSet(_Rows):
+    __slots__ = ()
+    row = Point
+    x = property(lambda self: self.array[:, 0])
+    y = property(lambda self: self.array[:, 1])
+
+    @staticmethod
+    def _coerce(points):
+        return np.asarray(points, dtype = np.float64).reshape(-1, 2)
+
+'''
+Envelope
+    The vertices of a halfplane envelope (see halfplane_envelope), in clockwise
+    order around the region: decreasing x for 'upper', increasing x for 'lower'
+'''
+class Envelope(PointSet):
+    __slots__ = ('hull_type',)
+
+    def __init__(self, vertices = (), hull_type = None):
+        super().__init__(vertices)
+        self.hull_type = hull_type
+
+    def _wrap(self, array):
+        return Envelope(array, self.hull_type)
+
+'''
+LineSet
+    Dual lines (slope, intercept, orientation) backed by an array with dtype LINE_DTYPE
+    lines['slope'] and the like return columns, as for the record array itself
+Attributes:
+- array: the backing array
+- slope, intercept, orientation: views of its columns
+'''
+class LineSet(_Rows):
+    __slots__ = ()
+    row = Line
+    slope = property(lambda self: self.array['slope'])
+    intercept = property(lambda self: self.array['intercept'])
+    orientation = property(lambda self: self.array['orientation'])
+
+    def __getitem__(self, index):
+        if isinstance(index, str):
+            return self.array[index]
+        return super().__getitem__(index)
+
+    @staticmethod
+    def _coerce(lines):
+        if isinstance(lines, LineSet):
+            return lines.array
+        if isinstance(lines, np.ndarray) and lines.dtype == LINE_DTYPE:
+            return lines.reshape(-1)
+        return np.array([tuple(line) for line in lines], dtype = LINE_DTYPE)
+
+'''
+ArcChain
+    Arcs (x, y, r, theta0, theta1) backed by a float64 array of shape (N, 5)
+    theta0, theta1 are in degrees, and each arc runs counterclockwise from theta0 to theta1
+Attributes:
+- array: the backing array
+- x, y, r, theta0, theta1: views of its columns
+'''
+class ArcChain(_Rows):
+    __slots__ = ()
+    row = Arc
+    x = property(lambda self: self.array[:, 0])
+    y = property(lambda self: self.array[:, 1])
+    r = property(lambda self: self.array[:, 2])
+    theta0 = property(lambda self: self.array[:, 3])
+    theta1 = property(lambda self: self.array[:, 4])
+
+    @staticmethod
+    def _coerce(arcs):
+        return np.asarray(arcs, dtype = np.float64).reshape(-1, 5)
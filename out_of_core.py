@@ -0,0 +1,206 @@
+import numpy as np
+import os
+import tempfile
+
+from duality_computation import (ConvexHullSweep, _stage, duality1_circlesToLines, duality2_linesToPoints,
+                                 hull_intersection_arcs, merge_hulls, prune_hull_candidates, sort_for_hull,
+                                 vertical_bounds)
+
+'''
+Solves instances too large to hold in memory as Python objects (or at all)
+
+Centers are read from a memory-mapped .npy or raw float64 file in blocks of at
+most 'max_rows' rows. Each block is transformed to dual points, split by
+orientation, pruned of points inside the block's hull (prune_hull_candidates) and
+sorted as sort_for_hull would sort it, and the sorted block is spilled to a
+temporary .npy file (a "run"). The runs of each orientation are then
+merged into one x-sorted memory-mapped file, reading at most about 'max_rows'
+rows of all runs together at a time. Finally the sweep runs over the sorted file
+block by block, merging each block's hull into the hull so far along its bridge
+(as parallel_solver.py does for chunks hulled in parallel)
+
+Memory use is O(max_rows + h) for a hull of h points, independent of the number of
+disks; disk use is at most about 16 bytes per disk for the runs plus as much for the
+merged files, and usually far less after pruning
+'''
+
+# Blocks are never made smaller than this, however many runs are merged at once
+MIN_BLOCK_ROWS = 1 << 10
+
+###################################
+#######  Read large inputs  #######
+###################################
+
+'''
+Opens a file of circle centers without reading it into memory
+Input:
+- path: a .npy file of shape (N, 2), or a raw file of native-endian float64 (x, y) pairs
+- input_format: 'npy', 'raw', or None to infer from the file extension
+Returns: a read-only memory-mapped array of shape (N, 2)
+'''
+def open_centers(path, input_format = None):
+    if input_format is None:
+        input_format = 'npy' if path.endswith('.npy') else 'raw'
+
+    if input_format == 'npy':
+        centers = np.load(path, mmap_mode = 'r')
+    elif os.path.getsize(path) == 0:
+        return np.empty((0, 2))
+    else:
+        centers = np.memmap(path, dtype = np.float64, mode = 'r')
+        if len(centers) % 2 != 0:
+            raise ValueError('Expected an even number of float64 values in %s, found %d' % (path, len(centers)))
+    if centers.ndim == 1:
+        centers = centers.reshape(-1, 2)
+    if centers.ndim != 2 or centers.shape[1] != 2:
+        raise ValueError('Expected an array of shape (N, 2), found %s' % (centers.shape,))
+    return centers
+
+########################################
+#######  External sort of points  ######
+########################################
+
+'''
+Transforms centers to dual points and sorts them for the sweep, spilling to disk
+Input:
+- centers: array-like of shape (N, 2) of circle centers, typically memory-mapped
+- directory: where the runs and the sorted files are written
+- max_rows: the number of rows read, sorted or merged at a time
+Returns: (points, x_bounds) where
+- points: {'upper': ..., 'lower': ...}, memory-mapped arrays of shape (n, 2) equal to
+          sort_for_hull of the dual points of each orientation, less points pruned
+          within their block; their hulls are those of all the dual points
+- x_bounds: (lower, upper) as returned by vertical_bounds for all the centers
+'''
+@_stage
+def external_sort_dual_points(centers, directory, max_rows = 1 << 20):
+    runs = {'upper': [], 'lower': []}
+    lower_bound, upper_bound = -np.inf, np.inf
+    for start in range(0, len(centers), max_rows):
+        lines = duality1_circlesToLines(np.asarray(centers[start:start + max_rows], dtype = np.float64))
+        block_lower, block_upper = vertical_bounds(lines)
+        lower_bound, upper_bound = max(lower_bound, block_lower), min(upper_bound, block_upper)
+
+        for hull_type, orientation in (('upper', 1), ('lower', -1)):
+            points = duality2_linesToPoints(lines[lines['orientation'] == orientation])
+            points = sort_for_hull(prune_hull_candidates(points, hull_type), hull_type)
+            if len(points) == 0: continue
+            path = os.path.join(directory, '%s_run%d.npy' % (hull_type, len(runs[hull_type])))
+            np.save(path, points)
+            runs[hull_type].append(np.load(path, mmap_mode = 'r'))
+
+    sorted_points = {}
+    for hull_type, hull_runs in runs.items():
+        if len(hull_runs) <= 1:
+            sorted_points[hull_type] = hull_runs[0] if hull_runs else np.empty((0, 2))
+            continue
+        path = os.path.join(directory, '%s_sorted.npy' % hull_type)
+        sorted_points[hull_type] = merge_sorted_runs(hull_runs, hull_type, path, max_rows)
+        for run in hull_runs:
+            os.remove(run.filename)
+    return sorted_points, (lower_bound, upper_bound)
+
+'''
+k-way merge of runs that are each sorted as sort_for_hull sorts points
+Input:
+- runs: list of arrays of shape (n_i, 2), typically memory-mapped
+- hull_type: 'upper' or 'lower'
+- path: the .npy file the merged points are written to
+- max_rows: the number of rows of all runs held in memory together
+Returns: a memory-mapped array equal to sort_for_hull(np.concatenate(runs), hull_type)
+Note:
+  Each step loads the next block of every run whose block is used up, then writes out
+  every row up to the smallest last key among the blocks of runs with rows still
+  unread: no row left unread can come before it. That run's block is used up, so
+  each step reads at least one new block
+'''
+@_stage
+def merge_sorted_runs(runs, hull_type, path, max_rows = 1 << 20):
+    block_rows = max(MIN_BLOCK_ROWS, max_rows // len(runs))
+    sign = 1.0 if hull_type == 'upper' else -1.0
+    out = np.lib.format.open_memmap(path, mode = 'w+', dtype = np.float64, shape = (sum(len(run) for run in runs), 2))
+    blocks = [np.empty((0, 2))] * len(runs)
+    next_rows = [0] * len(runs)
+    written = 0
+    carry = np.empty((0, 2))
+
+    while True:
+        for r, run in enumerate(runs):
+            if len(blocks[r]) == 0 and next_rows[r] < len(run):
+                blocks[r] = np.array(run[next_rows[r]:next_rows[r] + block_rows], dtype = np.float64)
+                next_rows[r] += len(blocks[r])
+        unfinished = [r for r in range(len(runs)) if next_rows[r] < len(runs[r])]
+        if len(unfinished) == 0 and all(len(block) == 0 for block in blocks): break
+
+        # Sort key (x, sign * y), as in sort_for_hull
+        bound = min(((blocks[r][-1, 0], sign * blocks[r][-1, 1]) for r in unfinished), default = None)
+        taken = []
+        for r, block in enumerate(blocks):
+            count = len(block) if bound is None else _count_up_to(block, bound, sign)
+            taken.append(block[:count])
+            blocks[r] = block[count:]
+        merged = np.concatenate([carry] + taken)
+        merged = merged[np.lexsort((sign * merged[:, 1], merged[:, 0]))]
+
+        # Keep the dominant (last) point of each x-coordinate; the last row is held
+        # back since the next step may bring more points with its x-coordinate
+        keep = merged[1:, 0] != merged[:-1, 0]
+        kept = merged[:-1][keep]
+        out[written:written + len(kept)] = kept
+        written += len(kept)
+        carry = merged[-1:]
+
+    out[written:written + len(carry)] = carry
+    written += len(carry)
+    out.flush()
+    del out
+    return np.load(path, mmap_mode = 'r')[:written]
+
+# Number of rows at the start of a sorted block whose key is at most 'bound'
+def _count_up_to(block, bound, sign):
+    bound_x, bound_tie_break = bound
+    start = np.searchsorted(block[:, 0], bound_x, side = 'left')
+    stop = np.searchsorted(block[:, 0], bound_x, side = 'right')
+    return start + int(np.searchsorted(sign * block[start:stop, 1], bound_tie_break, side = 'right'))
+
+##################################
+#######  Out-of-core sweep  ######
+##################################
+
+'''
+convex_hull for points that are already sorted, read a block at a time
+Input:
+- points: array of shape (n, 2) as returned by sort_for_hull, typically memory-mapped
+- hull_type: 'upper' or 'lower'
+- max_rows: the number of points swept at a time
+Output:
+- hull: array of shape (h, 2), the same as convex_hull(points, hull_type)
+'''
+@_stage
+def streaming_convex_hull(points, hull_type, max_rows = 1 << 20):
+    hull = np.empty((0, 2))
+    for start in range(0, len(points), max_rows):
+        block = np.asarray(points[start:start + max_rows], dtype = np.float64)
+        hull = merge_hulls(hull, ConvexHullSweep(block, hull_type).run(), hull_type)
+    return hull
+
+'''
+Finds the intersection of disks like solve_disk_intersection, for centers read
+from a memory-mapped array
+Input:
+- centers: array-like of shape (N, 2) of circle centers, or the path of a file
+           accepted by open_centers
+- max_rows: the number of rows read, sorted, merged or swept at a time
+- directory: where temporary files are written (defaults to the system temporary directory);
+             they are removed before returning
+Returns: an ArcChain of (x, y, r, theta0, theta1) arcs, as solve_disk_intersection
+'''
+@_stage
+def solve_disk_intersection_out_of_core(centers, max_rows = 1 << 20, directory = None):
+    if isinstance(centers, str):
+        centers = open_centers(centers)
+    with tempfile.TemporaryDirectory(dir = directory) as scratch:
+        points, x_bounds = external_sort_dual_points(centers, scratch, max_rows)
+        hulls = [streaming_convex_hull(points[hull_type], hull_type, max_rows) for hull_type in ('upper', 'lower')]
+        del points
+        return hull_intersection_arcs(*hulls, x_bounds)
@@ -0,0 +1,226 @@
+import numpy as np
+import concurrent.futures
+import itertools
+import os
+from multiprocessing import shared_memory
+
+from duality_computation import (ConvexHullSweep, duality1_circlesToLines, duality2_linesToPoints,
+                                 hull_intersection_arcs, merge_hulls, prune_hull_candidates, solve_disk_intersection,
+                                 sort_for_hull, vertical_bounds)
+from geometry import ArcChain
+
+'''
+Runs the disk-intersection solver over a process pool, either across many
+independent instances or within one very large instance
+
+Arrays are handed to workers through shared-memory buffers, so only the buffer
+name and a few offsets are pickled on the way in
+'''
+
+###############################################
+######  Solve many instances in parallel  #####
+###############################################
+
+'''
+Solves every instance in 'instances' with solve_disk_intersection over a process pool
+Input:
+- instances: iterable of array-likes of shape (N, 2) of circle centers
+             (consumed lazily, so it may be a generator over a large file)
+- max_workers: number of worker processes (defaults to the number of CPUs)
+- chunk_size: number of instances sent to a worker at a time
+- ordered: if True, results are yielded in input order;
+           otherwise they are yielded as soon as each chunk completes
+Yields:
+- (index, arcs) where index is the position of the instance in 'instances'
+  and arcs is an array of shape (k, 5) of (x, y, r, theta0, theta1) arcs
+'''
+def solve_many(instances, max_workers = None, chunk_size = 64, ordered = True):
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_in_flight = 2 * max_workers
+    chunks = _chunked(enumerate(instances), chunk_size)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers) as executor:
+        in_flight = {}
+        pending = {}
+        next_index = 0
+        try:
+            for chunk in itertools.islice(chunks, max_in_flight):
+                _submit(executor, in_flight, chunk)
+
+            while len(in_flight) > 0:
+                finished, _ = concurrent.futures.wait(in_flight, return_when = concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    first_index, buffer = in_flight.pop(future)
+                    buffer.close()
+                    buffer.unlink()
+                    for offset, arcs in enumerate(future.result()):
+                        pending[first_index + offset] = arcs
+
+                # Keep the pool busy without reading the whole input up front
+                for chunk in itertools.islice(chunks, len(finished)):
+                    _submit(executor, in_flight, chunk)
+
+                if ordered:
+                    while next_index in pending:
+                        yield next_index, pending.pop(next_index)
+                        next_index += 1
+                else:
+                    for index in sorted(pending):
+                        yield index, pending.pop(index)
+        finally:
+            for future, (_, buffer) in in_flight.items():
+                future.cancel()
+                buffer.close()
+                buffer.unlink()
+
+###################################################
+######  Solve one large instance in parallel  #####
+###################################################
+
+'''
+Solves one instance like solve_disk_intersection, with the upper and lower hulls
+computed concurrently, each split into x-sorted chunks that are hulled in parallel
+Input:
+- centers: array-like of shape (N, 2) of circle centers
+- max_workers: number of worker processes (defaults to the number of CPUs)
+- min_chunk_points: chunks are never made smaller than this
+Returns: an ArcChain of (x, y, r, theta0, theta1) arcs, as solve_disk_intersection
+'''
+def parallel_solve_disk_intersection(centers, max_workers = None, min_chunk_points = 1 << 16):
+    lines = duality1_circlesToLines(centers)
+    if len(lines) == 0: return ArcChain()
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers) as executor:
+        # Submit both sides before waiting on either, so they run concurrently
+        jobs = {}
+        for hull_type, orientation in (('upper', 1), ('lower', -1)):
+            points = duality2_linesToPoints(lines[lines['orientation'] == orientation])
+            jobs[hull_type] = _ChunkedHullJob(executor, points, hull_type, 4 * max_workers, min_chunk_points)
+        hulls = {hull_type: job.result() for hull_type, job in jobs.items()}
+
+    return hull_intersection_arcs(hulls['upper'], hulls['lower'], vertical_bounds(lines))
+
+'''
+Computes convex_hull(points, hull_type) by hulling x-sorted chunks in parallel
+and merging neighbouring chunk hulls along their bridges
+Input:
+- points: array-like of points (x, y), in any order
+- hull_type: 'upper' or 'lower'
+- max_workers: number of worker processes (defaults to the number of CPUs)
+- min_chunk_points: chunks are never made smaller than this
+Output:
+- hull: array of shape (h, 2), the same as convex_hull(points, hull_type)
+'''
+def parallel_convex_hull(points, hull_type, max_workers = None, min_chunk_points = 1 << 16):
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers) as executor:
+        return _ChunkedHullJob(executor, points, hull_type, 4 * max_workers, min_chunk_points).result()
+
+'''
+Hull of one point set, split into chunks that are submitted to an executor
+The sorted points live in a shared-memory buffer until result() is called
+'''
+class _ChunkedHullJob:
+    def __init__(self, executor, points, hull_type, num_chunks, min_chunk_points):
+        points = sort_for_hull(prune_hull_candidates(points, hull_type), hull_type)
+        self.hull_type = hull_type
+        self._buffer = None
+        self._futures = []
+        if len(points) == 0:
+            self._points = points
+            return
+
+        self._buffer = shared_memory.SharedMemory(create = True, size = points.nbytes)
+        self._points = np.ndarray(points.shape, dtype = np.float64, buffer = self._buffer.buf)
+        self._points[:] = points
+
+        num_chunks = max(1, min(num_chunks, len(points) // max(min_chunk_points, 1)))
+        bounds = np.linspace(0, len(points), num_chunks + 1).astype(int).tolist()
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            self._futures.append(executor.submit(_hull_shared_range, self._buffer.name, len(points), start, stop, hull_type))
+
+    def result(self):
+        try:
+            hull = self._points[:0].copy()
+            for future in self._futures:
+                hull = merge_hulls(hull, self._points[future.result()], self.hull_type)
+            return hull
+        finally:
+            if self._buffer is not None:
+                del self._points
+                self._buffer.close()
+                self._buffer.unlink()
+                self._buffer = None
+
+## Helper methods for the process pool ##
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if len(chunk) == 0: return
+        yield chunk
+
+'''
+Copies a chunk of (index, centers) pairs into a shared-memory buffer and submits it
+'''
+def _submit(executor, in_flight, chunk):
+    arrays = [np.asarray(centers, dtype = np.float64).reshape(-1, 2) for _, centers in chunk]
+    offsets = np.cumsum([0] + [len(centers) for centers in arrays]).tolist()
+
+    buffer = shared_memory.SharedMemory(create = True, size = max(offsets[-1] * 2 * 8, 1))
+    packed = np.ndarray((offsets[-1], 2), dtype = np.float64, buffer = buffer.buf)
+    for centers, start in zip(arrays, offsets):
+        packed[start:start + len(centers)] = centers
+    del packed
+
+    future = executor.submit(_solve_shared_chunk, buffer.name, offsets)
+    in_flight[future] = (chunk[0][0], buffer)
+
+'''
+Worker: solves each instance stored in a shared-memory buffer
+Returns a list with one (k, 5) array of arcs per instance
+'''
+def _solve_shared_chunk(buffer_name, offsets):
+    buffer = _attach_shared_memory(buffer_name)
+    try:
+        packed = np.ndarray((offsets[-1], 2), dtype = np.float64, buffer = buffer.buf)
+        results = []
+        for start, stop in zip(offsets[:-1], offsets[1:]):
+            arcs = solve_disk_intersection(packed[start:stop])
+            results.append(np.array(arcs, dtype = np.float64).reshape(-1, 5))
+        del packed
+        return results
+    finally:
+        buffer.close()
+
+'''
+Attaches to an existing shared-memory block owned (and unlinked) by the parent process
+Pool workers share the parent's resource tracker, so on Python < 3.13, where
+attaching always registers the block, the registration is already accounted for
+'''
+def _attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name = name, track = False)
+    except TypeError:
+        return shared_memory.SharedMemory(name = name)
+
+'''
+Worker: hulls points[start:stop] of a sorted point array stored in shared memory
+Returns the indices (into the whole array) of the chunk's hull points
+'''
+def _hull_shared_range(buffer_name, num_points, start, stop, hull_type):
+    buffer = _attach_shared_memory(buffer_name)
+    try:
+        points = np.ndarray((num_points, 2), dtype = np.float64, buffer = buffer.buf)
+        sweep = ConvexHullSweep(points[start:stop], hull_type)
+        sweep.run()
+        indices = sweep.hull_indices + start
+        del points, sweep
+        return indices
+    finally:
+        buffer.close()
@@ -0,0 +1,145 @@
+import numpy as np
+
+'''
+Robust geometric predicates for the duality pipeline
+
+Each predicate is first evaluated in floating point together with a bound on its
+rounding error (a "float filter"). Only when the result is within that bound of
+zero, where float arithmetic could get the sign wrong, is it evaluated again
+exactly with rational arithmetic. Inputs are exact binary floats, so the exact
+evaluation is always correct, and in the common case the cost is a few extra
+float operations
+
+Reference: Shewchuk, J. R. "Adaptive Precision Floating-Point Arithmetic and
+Fast Robust Geometric Predicates." Discrete & Computational Geometry 18, 1997.
+'''
+
+# Relative error bound of orient2d evaluated as a difference of two products,
+# (3 + 16 eps) eps for double precision eps = 2^-53 (Shewchuk's ccwerrboundA)
+ORIENT_ERROR_BOUND = (3 + 16 * 2.0 ** -53) * 2.0 ** -53
+
+####################################
+#######  Orientation tests  ########
+####################################
+
+'''
+Orientation of the triangle a -> b -> c
+Input: three points (x, y)
+Returns: 1 if the triangle turns counterclockwise, -1 if clockwise, 0 if the points are collinear
+'''
+def orient2d(a, b, c):
+    left = (b[0] - a[0]) * (c[1] - a[1])
+    right = (b[1] - a[1]) * (c[0] - a[0])
+    det = left - right
+    if abs(det) > ORIENT_ERROR_BOUND * (abs(left) + abs(right)):
+        return 1 if det > 0 else -1
+    return orient2d_exact(a, b, c)
+
+'''
+Orientation of the direction c -> d relative to the direction a -> b, which is
+orient2d(a, b, c) when c == a
+Input: four points (x, y)
+Returns: 1 if d - c turns counterclockwise from b - a, -1 if clockwise, 0 if they are parallel
+Note:
+  The determinant has the same form as orient2d's (two products of differences),
+  so the same error bound applies
+'''
+def cross2d(a, b, c, d):
+    left = (b[0] - a[0]) * (d[1] - c[1])
+    right = (b[1] - a[1]) * (d[0] - c[0])
+    det = left - right
+    if abs(det) > ORIENT_ERROR_BOUND * (abs(left) + abs(right)):
+        return 1 if det > 0 else -1
+    from fractions import Fraction
+    det = ((Fraction(b[0]) - Fraction(a[0])) * (Fraction(d[1]) - Fraction(c[1]))
+           - (Fraction(b[1]) - Fraction(a[1])) * (Fraction(d[0]) - Fraction(c[0])))
+    return (det > 0) - (det < 0)
+
+'''
+orient2d computed with exact rational arithmetic
+'''
+def orient2d_exact(a, b, c):
+    # Imported here since fractions (and decimal) take longer to import than this module
+    from fractions import Fraction
+    ax, ay = Fraction(a[0]), Fraction(a[1])
+    det = (Fraction(b[0]) - ax) * (Fraction(c[1]) - ay) - (Fraction(b[1]) - ay) * (Fraction(c[0]) - ax)
+    return (det > 0) - (det < 0)
+
+'''
+orient2d over arrays of triangles, given coordinate by coordinate
+Input: arrays (or scalars) ax, ay, bx, by, cx, cy that broadcast together
+       exact: if False, triangles the float filter cannot decide are given 0 instead
+              of being evaluated exactly, for callers that treat them like collinear ones
+Returns: int8 array of orient2d(a, b, c) for each triangle
+Note:
+  Only the triangles that the float filter cannot decide are evaluated exactly, one at
+  a time, except those that are degenerate in a way the floats show exactly: c == b, or
+  a zero difference in each product (a difference of floats is zero only if they are equal)
+'''
+def orient2d_array(ax, ay, bx, by, cx, cy, exact = True):
+    abx, aby = bx - ax, by - ay
+    acx, acy = cx - ax, cy - ay
+    left = abx * acy
+    right = aby * acx
+    det = left - right
+    signs = np.array(np.sign(det), dtype = np.int8)
+    uncertain = np.abs(det) <= ORIENT_ERROR_BOUND * (np.abs(left) + np.abs(right))
+    if not exact:
+        signs[uncertain] = 0
+        return signs
+    if uncertain.any():
+        # det is already 0 for these
+        degenerate = (((abx == 0) | (acy == 0)) & ((aby == 0) | (acx == 0))) | ((cx == bx) & (cy == by))
+        uncertain &= ~degenerate
+    if uncertain.any():
+        coordinates = np.broadcast_arrays(ax, ay, bx, by, cx, cy)
+        for i in map(tuple, np.argwhere(uncertain)):
+            ax_i, ay_i, bx_i, by_i, cx_i, cy_i = (float(c[i]) for c in coordinates)
+            signs[i] = orient2d_exact((ax_i, ay_i), (bx_i, by_i), (cx_i, cy_i))
+    return signs
+
+######################################
+#######  Intersection tests  #########
+######################################
+
+'''
+Finds where segment p1 -> p2 crosses segment q1 -> q2
+Input: four points (x, y); either segment may be vertical
+Returns: the intersection point (x, y), or None if the segments do not meet,
+         meet only in a shared collinear piece, or either one has zero length
+Note:
+  Whether the segments meet is decided exactly with orient2d; the point itself is
+  computed in floating point and clamped to the bounding boxes of both segments
+'''
+def segment_intersection(p1, p2, q1, q2):
+    d1 = orient2d(q1, q2, p1)
+    d2 = orient2d(q1, q2, p2)
+    if d1 == d2 != 0: return None
+    d3 = orient2d(p1, p2, q1)
+    d4 = orient2d(p1, p2, q2)
+    if d3 == d4: return None    # Also rejects collinear and zero-length segments
+
+    if d1 == 0: return (p1[0], p1[1])
+    if d2 == 0: return (p2[0], p2[1])
+    if d3 == 0: return (q1[0], q1[1])
+    if d4 == 0: return (q2[0], q2[1])
+
+    # Solve p1 + t (p2 - p1) on the line through q1 and q2
+    dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+    ex, ey = q2[0] - q1[0], q2[1] - q1[1]
+    t = ((q1[0] - p1[0]) * ey - (q1[1] - p1[1]) * ex)/(dx * ey - dy * ex)
+    x = _clamp(p1[0] + t * dx, max(min(p1[0], p2[0]), min(q1[0], q2[0])), min(max(p1[0], p2[0]), max(q1[0], q2[0])))
+    y = _clamp(p1[1] + t * dy, max(min(p1[1], p2[1]), min(q1[1], q2[1])), min(max(p1[1], p2[1]), max(q1[1], q2[1])))
+    return (x, y)
+
+def _clamp(value, low, high):
+    return min(max(value, low), high)
+
+'''
+Intersection of the lines y = m_1 x + b_1 and y = m_2 x + b_2
+Returns: (x, y), or None if the lines are parallel
+'''
+def line_intersection(m_1, b_1, m_2, b_2):
+    if m_1 == m_2: return None
+    x = (b_2 - b_1)/(m_1 - m_2)
+    return (x, m_1 * x + b_1)
@@ -0,0 +1,212 @@
+import numpy as np
+import collections
+import hashlib
+import os
+import re
+import tempfile
+
+from duality_computation import (convex_hull, duality1_circlesToLines, duality2_linesToPoints, hull_intersection_arcs,
+                                 profile_count, vertical_bounds)
+from geometry import ArcChain
+
+'''
+Content-addressed cache in front of solve_disk_intersection
+
+A disk set is identified by its canonical form: the distinct centers sorted
+lexicographically (so the order and repetition of the input do not matter, as in
+Visualization.get_input_points). Each cached value is keyed by a hash of the part
+of the canonical centers it depends on:
+- arcs:  all the centers -> the arcs bounding the intersection region
+- upper: the centers above the x-axis -> their upper hull
+- lower: the centers below the x-axis -> their lower hull
+so when a disk set changes only on one side of the x-axis, the hull of the other
+side is reused and only the changed side is swept. Disks centered on the x-axis
+only bound the region in x (see vertical_bounds), which is cheap to recompute
+
+Values are kept in an in-memory LRU of at most 'max_entries' arrays and, given a
+directory, in an on-disk tier of at most 'max_disk_bytes' that is shared between
+runs. Files on disk are evicted least recently used first, by modification time.
+Only files named like the keys of cache_key are ever read, evicted or removed, so
+other files in the directory are left alone
+'''
+
+# Part of every key, so that a change to the solver or the key format invalidates old entries
+CACHE_VERSION = 1
+
+# Names of the keys made by cache_key, the only ones kept on disk
+KEY_PATTERN = re.compile(r'(arcs|upper|lower)-[0-9a-f]{32}')
+
+'''
+Canonical form of a disk set
+Input: array-like of shape (N, 2) of circle centers
+Returns: array of shape (n, 2) of the distinct centers sorted by (x, y)
+'''
+def canonical_centers(centers):
+    # +0.0 turns -0.0 into 0.0, which has a different byte pattern but is the same center
+    centers = np.asarray(centers, dtype = np.float64).reshape(-1, 2) + 0.0
+    if len(centers) == 0: return centers
+    centers = centers[np.lexsort((centers[:, 1], centers[:, 0]))]
+    distinct = np.append(True, np.any(centers[1:] != centers[:-1], axis = 1))
+    return centers[distinct]
+
+'''
+Key of a cached value of kind 'kind' computed from the canonical centers 'centers'
+'''
+def cache_key(kind, centers):
+    digest = hashlib.blake2b(digest_size = 16)
+    digest.update(b'%s:%d:' % (kind.encode(), CACHE_VERSION))
+    digest.update(np.ascontiguousarray(centers).tobytes())
+    return '%s-%s' % (kind, digest.hexdigest())
+
+'''
+SolutionCache
+    Solves disk sets like solve_disk_intersection, reusing the arcs and hulls of
+    disk sets that were solved before
+Input:
+- max_entries: the number of arrays kept in memory
+- directory: where the on-disk tier is kept, or None for memory only
+- max_disk_bytes: the size the on-disk tier is kept under
+Usage:
+  solve(centers) returns the arcs as an ArcChain, with the arrays of cached values
+  read-only; stats counts the hits and misses of each kind of value
+'''
+class SolutionCache:
+    def __init__(self, max_entries = 256, directory = None, max_disk_bytes = 1 << 30):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = collections.Counter()
+        self._memory = collections.OrderedDict()    # key -> array, least recently used first
+        self._disk = collections.OrderedDict()      # key -> file size, least recently used first
+        self._disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+            self._scan_disk()
+
+    def __len__(self):
+        return len(self._memory.keys() | self._disk.keys())
+
+    def __contains__(self, key):
+        return key in self._memory or key in self._disk
+
+    def solve(self, centers):
+        centers = canonical_centers(centers)
+        arcs_key = cache_key('arcs', centers)
+        arcs = self._lookup('arcs', arcs_key)
+        if arcs is not None:
+            return ArcChain(arcs)
+
+        y = centers[:, 1]
+        hulls = []
+        for hull_type, side in (('upper', y > 0), ('lower', y < 0)):
+            key = cache_key(hull_type, centers[side])
+            hull = self._lookup(hull_type, key)
+            if hull is None:
+                points = duality2_linesToPoints(duality1_circlesToLines(centers[side]))
+                hull = self.put(key, convex_hull(points, hull_type))
+            hulls.append(hull)
+
+        x_bounds = vertical_bounds(duality1_circlesToLines(centers[y == 0]))
+        arcs = hull_intersection_arcs(*hulls, x_bounds)
+        return ArcChain(self.put(arcs_key, arcs.array))
+
+    '''
+    Returns the cached array for 'key', or None if it is not cached
+    '''
+    def get(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if key not in self._disk:
+            return None
+
+        path = self._path(key)
+        try:
+            value = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            # Removed by another process, or cut short by a crash while it was written
+            self._forget_file(key)
+            return None
+        self._disk.move_to_end(key)
+        return self._remember(key, value)
+
+    '''
+    Caches 'value' (an array) under 'key'; keys not made by cache_key are only kept in memory
+    Returns: the cached, read-only copy of 'value'
+    '''
+    def put(self, key, value):
+        value = self._remember(key, np.array(value))
+        if self.directory is not None and key not in self._disk and KEY_PATTERN.fullmatch(key):
+            self._write_file(key, value)
+        return value
+
+    '''
+    Empties both tiers
+    '''
+    def clear(self):
+        self._memory.clear()
+        for key in list(self._disk):
+            self._forget_file(key, remove = True)
+
+    def _lookup(self, kind, key):
+        value = self.get(key)
+        outcome = 'miss' if value is None else 'hit'
+        self.stats['%s.%s' % (kind, outcome)] += 1
+        profile_count('SolutionCache.%s.%s' % (kind, outcome))
+        return value
+
+    ## In-memory tier ##
+
+    def _remember(self, key, value):
+        value.setflags(write = False)
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last = False)
+        return value
+
+    ## On-disk tier ##
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    # Indexes the entries left by earlier runs, oldest first
+    def _scan_disk(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            key, extension = os.path.splitext(name)
+            if extension != '.npy' or not KEY_PATTERN.fullmatch(key): continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_files()
+
+    def _write_file(self, key, value):
+        # Written under a temporary name and renamed, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, value)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        size = os.path.getsize(self._path(key))
+        self._disk[key] = size
+        self._disk_bytes += size
+        self._evict_files()
+
+    def _evict_files(self):
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 0:
+            self._forget_file(next(iter(self._disk)), remove = True)
+
+    def _forget_file(self, key, remove = False):
+        self._disk_bytes -= self._disk.pop(key)
+        if remove:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
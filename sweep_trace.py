@@ -0,0 +1,155 @@
+import numpy as np
+import array
+import json
+import os
+
+from duality_computation import ConvexHullSweep
+
+'''
+Record and replay of the sweepline convex hull algorithm
+
+A trace stores the points of one sweep plus, for every step, the stack entries
+that the step popped; the one push of step i is always point i, so it needs no
+storage. A TraceCursor rebuilds the hull stack at any step from these deltas,
+moving forward or backward in time proportional to the number of steps it
+crosses, without running the hull algorithm again
+
+On disk a trace is a directory of .npy files that is memory-mapped when loaded:
+- points.npy:      float64 array of shape (N, 2), the points sorted by x-coordinate
+- pop_offsets.npy: integer array of shape (N + 1,); step i popped
+                   popped[pop_offsets[i]:pop_offsets[i + 1]]
+- popped.npy:      integer array of the popped point indices, in stack order
+- trace.json:      the hull type and the format version
+Every point is popped at most once, so a trace of N points takes at most
+16N bytes of points plus 8N bytes of indices (for N < 2^31)
+'''
+
+TRACE_VERSION = 1
+
+'''
+SweepTrace
+    The recorded steps of one sweep
+Attributes:
+- points: array of shape (N, 2) of points sorted by x-coordinate
+- hull_type: 'upper' or 'lower'
+- pop_offsets, popped: the stack entries popped by each step (see above)
+'''
+class SweepTrace:
+    def __init__(self, points, hull_type, pop_offsets, popped):
+        self.points = points
+        self.hull_type = hull_type
+        self.pop_offsets = pop_offsets
+        self.popped = popped
+
+    '''
+    Returns the number of steps of the sweep (one per point)
+    '''
+    def __len__(self):
+        return len(self.points)
+
+    '''
+    Returns the size of the hull after 'step' steps, in O(1)
+    '''
+    def hull_size(self, step):
+        return step - int(self.pop_offsets[step])
+
+    def cursor(self, step = 0):
+        cursor = TraceCursor(self)
+        cursor.seek(step)
+        return cursor
+
+    def save(self, path):
+        os.makedirs(path, exist_ok = True)
+        np.save(os.path.join(path, 'points.npy'), self.points)
+        np.save(os.path.join(path, 'pop_offsets.npy'), self.pop_offsets)
+        np.save(os.path.join(path, 'popped.npy'), self.popped)
+        with open(os.path.join(path, 'trace.json'), 'w') as f:
+            json.dump({'version': TRACE_VERSION, 'hull_type': self.hull_type}, f)
+
+    '''
+    Opens a trace written by save(); the arrays are memory-mapped unless mmap is False
+    '''
+    @classmethod
+    def load(cls, path, mmap = True):
+        with open(os.path.join(path, 'trace.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != TRACE_VERSION:
+            raise ValueError('Unsupported trace version %r in %s' % (meta.get('version'), path))
+
+        mmap_mode = 'r' if mmap else None
+        arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode = mmap_mode)
+                  for name in ('points', 'pop_offsets', 'popped')]
+        return cls(arrays[0], meta['hull_type'], arrays[1], arrays[2])
+
+'''
+Runs the sweepline convex hull algorithm over 'points' and records its trace
+Input:
+- points: array-like of points (x, y) sorted by x-coordinate
+- hull_type: 'upper' or 'lower'
+Returns: a SweepTrace
+'''
+def record_trace(points, hull_type):
+    sweep = ConvexHullSweep(points, hull_type, record = True)
+    sweep.run()
+    index_dtype = np.int32 if len(sweep.points) < 2**31 else np.int64
+    pop_offsets = np.frombuffer(sweep.pop_offsets, dtype = np.int64).astype(index_dtype)
+    popped = np.frombuffer(sweep.popped, dtype = np.int64).astype(index_dtype)
+    return SweepTrace(sweep.points, hull_type, pop_offsets, popped)
+
+'''
+TraceCursor
+    The hull stack of a trace at one step, which can be moved to any other step
+    Moving from step s to step t costs O(|t - s|) plus the number of stack entries
+    popped or restored on the way
+Usage:
+  seek(step) moves to the state after 'step' points have been processed
+  hull_indices (a view that the next seek() overwrites) and hull give that state,
+  the same as ConvexHullSweep after step(step)
+'''
+class TraceCursor:
+    def __init__(self, trace):
+        self.trace = trace
+        self.step_num = 0
+        self._stack = array.array('q', bytes(8 * len(trace)))
+        self._top = 0
+
+    @property
+    def done(self):
+        return self.step_num >= len(self.trace)
+
+    @property
+    def hull_indices(self):
+        return np.frombuffer(self._stack, dtype = np.int64, count = self._top)
+
+    @property
+    def hull(self):
+        return self.trace.points[self.hull_indices]
+
+    def state(self):
+        return (self.hull, self.step_num, self.done)
+
+    def seek(self, step):
+        step = max(0, min(step, len(self.trace)))
+        stack, top = self._stack, self._top
+
+        # Forward: step i drops its popped entries off the top and pushes i
+        if step > self.step_num:
+            pops = np.diff(self.trace.pop_offsets[self.step_num:step + 1]).tolist()
+            for i, count in enumerate(pops, self.step_num):
+                top -= count
+                stack[top] = i
+                top += 1
+
+        # Backward: undoing step i removes i and puts its popped entries back
+        if step < self.step_num:
+            offsets = self.trace.pop_offsets[step:self.step_num + 1].tolist()
+            popped = self.trace.popped[offsets[0]:offsets[-1]].tolist()
+            for i in range(self.step_num - step - 1, -1, -1):
+                top -= 1
+                for j in range(offsets[i] - offsets[0], offsets[i + 1] - offsets[0]):
+                    stack[top] = popped[j]
+                    top += 1
+
+        self._top = top
+        self.step_num = step
+        return self.state()
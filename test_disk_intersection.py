@@ -0,0 +1,233 @@
+import numpy as np
+import pytest
+
+from duality_computation import ConvexHullSweep, IntersectionQuery, solve_disk_intersection, sort_for_hull
+from dynamic_disks import DynamicDiskSet
+from out_of_core import solve_disk_intersection_out_of_core
+from parallel_solver import parallel_solve_disk_intersection
+from solution_cache import SolutionCache
+from sweep_trace import SweepTrace, record_trace
+
+'''
+Randomized checks of the arcs found by each solver against a brute-force test of
+membership in every disk (run with 'python -m pytest')
+
+A disk through the origin with center c contains the point t*u (for a unit vector u
+and t >= 0) exactly when t <= 2 c.u, so the boundary of the intersection region in
+direction u is at distance min_i 2 c_i.u. Each instance is checked for:
+- every arc lying on one of the input circles
+- every arc lying inside all the disks, so on the boundary of the region
+- every boundary point, in many directions, lying on one of the arcs
+'''
+
+# Relative tolerance of the distances, and of the angles in degrees
+TOLERANCE = 1e-9
+ANGLE_TOLERANCE = 1e-7
+
+# The envelopes are cut off at |x| = 1000 in the dual plane (see halfplane_envelope),
+# so the arcs stop short of the origin by up to about 1/1000
+NEAR_ORIGIN = 2e-3
+
+NUM_DIRECTIONS = 2000
+
+'''
+Generates 'count' instances of each family of inputs
+Returns: a list of (name, centers), centers an array of shape (N, 2)
+'''
+def random_instances(count, max_disks = 30, seed = 0):
+    rng = np.random.default_rng(seed)
+    instances = []
+    for i in range(count):
+        n = int(rng.integers(1, max_disks + 1))
+        instances.append(('normal-%d' % i, rng.normal(size = (n, 2))))
+
+        # Small integer grid, with repeated centers and the center (0, 0)
+        instances.append(('grid-%d' % i, rng.integers(-3, 4, size = (n, 2)).astype(np.float64)))
+
+        # Centers on the x-axis bound the region by vertical dual lines
+        centers = rng.normal(size = (n, 2))
+        centers[rng.random(n) < 0.3, 1] = 0
+        instances.append(('x-axis-%d' % i, centers))
+
+        # Few distinct centers, each repeated
+        distinct = rng.normal(size = (int(rng.integers(1, 5)), 2))
+        instances.append(('duplicates-%d' % i, distinct[rng.integers(0, len(distinct), n)]))
+
+        # Integer points on one line, which may pass through the origin
+        steps = rng.integers(-3, 4, n)[:, None]
+        direction, offset = rng.integers(-2, 3, 2), rng.integers(-2, 3, 2)
+        instances.append(('collinear-%d' % i, (steps * direction + offset).astype(np.float64)))
+    return instances
+
+'''
+Asserts that 'arcs' (x, y, r, theta0, theta1) bound the intersection of the disks
+through the origin with the given centers
+'''
+def check_arcs(centers, arcs, directions):
+    centers = np.asarray(centers, dtype = np.float64).reshape(-1, 2)
+    arcs = np.asarray(arcs, dtype = np.float64).reshape(-1, 5)
+    if len(centers) == 0:
+        assert len(arcs) == 0
+        return
+    radii = np.hypot(centers[:, 0], centers[:, 1])
+    tolerance = TOLERANCE * max(radii.max(), 1)
+    assert np.isfinite(arcs).all()
+
+    x, y, r, theta0, theta1 = arcs.T
+    span = np.mod(theta1 - theta0, 360)
+    for arc in range(len(arcs)):
+        # On an input circle
+        distance = np.hypot(centers[:, 0] - x[arc], centers[:, 1] - y[arc])
+        assert np.any((distance <= tolerance) & (np.abs(radii - r[arc]) <= tolerance))
+
+        # Inside all the disks
+        theta = np.radians(theta0[arc] + span[arc] * np.linspace(0, 1, 7))
+        samples = np.stack([x[arc] + r[arc] * np.cos(theta), y[arc] + r[arc] * np.sin(theta)], axis = 1)
+        distance = np.hypot(samples[:, None, 0] - centers[:, 0], samples[:, None, 1] - centers[:, 1])
+        assert np.all(distance <= radii + tolerance)
+
+    # Each boundary point away from the origin is on an arc
+    reach = 2 * (centers @ directions.T).min(axis = 0)
+    boundary = (reach[:, None] * directions)[reach > NEAR_ORIGIN]
+    covered = np.zeros(len(boundary), dtype = bool)
+    for arc in range(len(arcs)):
+        offset = boundary - (x[arc], y[arc])
+        on_circle = np.abs(np.hypot(offset[:, 0], offset[:, 1]) - r[arc]) <= tolerance
+        angle = np.degrees(np.arctan2(offset[:, 1], offset[:, 0]))
+        on_arc = np.mod(angle - theta0[arc] + ANGLE_TOLERANCE, 360) <= span[arc] + 2 * ANGLE_TOLERANCE
+        covered |= on_circle & on_arc
+    assert covered.all(), 'boundary points on no arc: %s' % boundary[~covered][:5].tolist()
+
+'''
+Brute-force membership of 'points' in every disk, as an array of booleans, and the
+distance of each point from the nearest disk boundary relative to the largest radius
+'''
+def brute_force_contains(centers, points):
+    centers = np.asarray(centers, dtype = np.float64).reshape(-1, 2)
+    radii = np.hypot(centers[:, 0], centers[:, 1])
+    slack = radii - np.hypot(points[:, None, 0] - centers[:, 0], points[:, None, 1] - centers[:, 1])
+    return np.all(slack >= 0, axis = 1), np.abs(slack).min(axis = 1) / max(radii.max(), 1)
+
+@pytest.fixture(scope = 'module')
+def directions():
+    angles = np.random.default_rng(1).uniform(0, 2 * np.pi, NUM_DIRECTIONS)
+    return np.stack([np.cos(angles), np.sin(angles)], axis = 1)
+
+@pytest.mark.parametrize('hull_method', ['sweep', 'chan'])
+def test_solve_disk_intersection(directions, hull_method):
+    for name, centers in random_instances(60):
+        check_arcs(centers, solve_disk_intersection(centers, hull_method = hull_method), directions)
+
+def test_out_of_core(directions, tmp_path):
+    for name, centers in random_instances(10, max_disks = 60, seed = 2):
+        path = str(tmp_path / 'centers.npy')
+        np.save(path, centers)
+        check_arcs(centers, solve_disk_intersection_out_of_core(path, max_rows = 8, directory = str(tmp_path)), directions)
+
+def test_solution_cache(directions, tmp_path):
+    cache = SolutionCache(max_entries = 16, directory = str(tmp_path))
+    instances = random_instances(10, seed = 3) + [('empty', np.empty((0, 2)))]
+    # Solved twice: computed (or partly reused) the first time, cached the second
+    for name, centers in instances + instances:
+        check_arcs(centers, cache.solve(centers[::-1]), directions)
+
+def test_solution_cache_leaves_other_files(tmp_path):
+    foreign = tmp_path / 'my_input_centers.npy'
+    np.save(foreign, np.ones((1000, 2)))
+    # Small enough that every entry is evicted as soon as it is written
+    cache = SolutionCache(directory = str(tmp_path), max_disk_bytes = 4096)
+    for name, centers in random_instances(3, seed = 5):
+        cache.solve(centers)
+    assert len(SolutionCache(directory = str(tmp_path), max_disk_bytes = 0)) == 0
+    cache.clear()
+    assert foreign.exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['my_input_centers.npy']
+
+def test_parallel(directions):
+    for name, centers in random_instances(1, max_disks = 200, seed = 4):
+        check_arcs(centers, parallel_solve_disk_intersection(centers, max_workers = 2, min_chunk_points = 8), directions)
+
+def test_dynamic_disk_set(directions):
+    rng = np.random.default_rng(6)
+    for name, centers in random_instances(10, max_disks = 100, seed = 6):
+        # Start from half the centers, insert the rest, then delete a random part
+        half = len(centers) // 2
+        disks = DynamicDiskSet(centers[:half])
+        for center in centers[half:]:
+            disks.insert(center)
+        check_arcs(centers, disks.intersection(), directions)
+
+        deleted = rng.random(len(centers)) < 0.5
+        for center in centers[deleted]:
+            disks.delete(center)
+        assert len(disks) == np.count_nonzero(~deleted)
+        check_arcs(centers[~deleted], disks.intersection(), directions)
+
+def test_dynamic_disk_set_delete_missing():
+    disks = DynamicDiskSet([(1.0, 2.0), (1.0, 2.0), (3.0, 0.0)])
+    for center in [(1.0, 2.0), (1.0, 2.0), (3.0, 0.0)]:
+        disks.delete(center)
+    for center in [(1.0, 2.0), (3.0, 0.0), (2.0, -1.0)]:
+        with pytest.raises(KeyError) as error:
+            disks.delete(center)
+        assert error.value.args == (center,)
+
+def test_intersection_query_contains():
+    rng = np.random.default_rng(7)
+    for name, centers in random_instances(20, seed = 7):
+        query = IntersectionQuery.from_centers(centers)
+        # Points all around, points in the box of the smallest disk (where the region is)
+        # and points along the rays through the centers
+        extent = 2 * np.abs(centers).max()
+        smallest = centers[np.argmin(np.hypot(centers[:, 0], centers[:, 1]))]
+        points = np.concatenate([[(0.0, 0.0)], rng.uniform(-extent, extent, size = (1000, 2)),
+                                 smallest + rng.uniform(-1, 1, size = (1000, 2)) * np.hypot(*smallest),
+                                 centers * rng.uniform(0, 2, size = (len(centers), 1))])
+        expected, margin = brute_force_contains(centers, points)
+        # Points within rounding of a circle may go either way
+        decided = margin > TOLERANCE
+        assert query.contains([0.0, 0.0]).all()
+        assert np.array_equal(query.contains(points)[decided], expected[decided]), name
+
+def test_intersection_query_area():
+    rng = np.random.default_rng(8)
+    num_samples = 100000
+    for name, centers in random_instances(4, seed = 8):
+        query = IntersectionQuery.from_centers(centers)
+        # The region lies in the smallest disk, so sample the box around it
+        smallest = np.argmin(np.hypot(centers[:, 0], centers[:, 1]))
+        center, radius = centers[smallest], np.hypot(*centers[smallest])
+        if radius == 0:
+            assert query.area == 0
+            continue
+        points = center + rng.uniform(-radius, radius, size = (num_samples, 2))
+        fraction = np.mean(brute_force_contains(centers, points)[0])
+        box = (2 * radius) ** 2
+        error = 5 * box * np.sqrt(fraction * (1 - fraction) / num_samples) + 1e-9 * box
+        assert abs(query.area - fraction * box) <= error, name
+
+def test_trace_cursor_seek(tmp_path):
+    rng = np.random.default_rng(9)
+    for name, centers in random_instances(5, max_disks = 100, seed = 9):
+        for hull_type in ('upper', 'lower'):
+            points = sort_for_hull(centers, hull_type)
+            # The stack of the sweep after each step (hull_indices is a view, so copied)
+            sweep = ConvexHullSweep(points, hull_type)
+            expected = [sweep.hull_indices.copy()]
+            while not sweep.done:
+                sweep.step()
+                expected.append(sweep.hull_indices.copy())
+
+            trace = record_trace(points, hull_type)
+            path = str(tmp_path / ('%s-%s' % (name, hull_type)))
+            trace.save(path)
+            loaded = SweepTrace.load(path)
+            assert isinstance(loaded.popped, np.memmap)
+            for trace in (trace, loaded):
+                # Random steps in both directions, including both ends
+                cursor = trace.cursor()
+                for step in list(rng.integers(0, len(points) + 1, 20)) + [len(points), 0, len(points)]:
+                    cursor.seek(int(step))
+                    assert cursor.step_num == step
+                    assert np.array_equal(cursor.hull_indices, expected[step]), (name, hull_type, step)
+                    assert np.array_equal(cursor.hull, points[expected[step]])
@@ -1,303 +1,592 @@
 import numpy as np
-from matplotlib import pyplot as plt
-import random
-import matplotlib
-import math
+import bisect
+import time
 
 from duality_computation import *
+from sweep_trace import record_trace
+
+# Imported by _import_matplotlib() when the first Visualization is created, so that
+# importing this module (e.g. for SweepScheduler) does not load pyplot or a GUI backend
+matplotlib = None
+plt = None
+
+def _import_matplotlib():
+    global matplotlib, plt
+    if plt is not None: return
+    import matplotlib
+    import matplotlib.collections
+    import matplotlib.patches
+    from matplotlib import pyplot
+    plt = pyplot
 
-########################################
-######## Set up visualization ##########
-########################################
-
-plt.ion()
-fig, (circle_ax, halfplane_ax, hull_ax) = plt.subplots(nrows = 1, ncols = 3, figsize = (14,4))
-circle_ax.xaxis.set_visible(False)
-circle_ax.yaxis.set_visible(False)
-halfplane_ax.xaxis.set_visible(False)
-halfplane_ax.yaxis.set_visible(False)
-hull_ax.xaxis.set_visible(False)
-hull_ax.yaxis.set_visible(False)
-
-# Set up circle image
-circle_ax.set_xlim(-3, 3)
-circle_ax.set_ylim(-3, 3)
-circle_ax.scatter([0], [0])
-arc_patches = []
-arc_plt = circle_ax.add_collection(matplotlib.collections.PatchCollection([]))
-
-# Set up halfplane image
-halfplane_ax.set_xlim(-3, 3)
-halfplane_ax.set_ylim(-3, 3)
-emph_lines_plt, = halfplane_ax.plot([], [], c = 'b', lw = 3, zorder = 3)
-
-# Set up hull image
-hull_ax.set_xlim(-3, 3)
-hull_ax.set_ylim(-3, 3)
-
-points_plt = hull_ax.scatter([], [])
-hull_plt, = hull_ax.plot([], [])
-sweepline = hull_ax.axvline(ymax = 0) # Line starts invisible
-
-########################################
-#############  Main method  ############
-########################################
-
-def main():
-    # Draw initial circles
-    center_points = get_input_points()
-
-    # Draw initial halfplane lines
-    lines = [duality1_circleToLine(circle) for circle in center_points]
-    min_x, max_x, min_y, max_y = scale_plot_for_line_intersections(lines)
-    x = np.linspace(min_x, max_x, 10)
-    for (m, b, orientation) in lines:
-        y = m*x + b
-        color = 'b' if orientation == 1 else 'r'
-        fill_to = max_y if orientation == 1 else min_y
-
-        halfplane_ax.plot(x, y, color)
-        halfplane_ax.fill_between(x, y, fill_to, alpha = 0.05, color = color)
-
-    # Calculate upper hull = upper envelope
-    upper_points = [duality2_lineToPoint(line) for line in lines if line[-1] == 1]
-    min_x, max_x, min_y, max_y = scale_plot_for_points(upper_points)
-    draw_points(upper_points)
-    upper_envelope = visualize_convex_hull(upper_points, 'upper', min_x, max_x)
-    while not plt.waitforbuttonpress(): pass
-    draw_lines([])
-    draw_points([])
-
-    # Calculate lower hull = lower envelope
-    lower_points = [duality2_lineToPoint(line) for line in lines if line[-1] == -1]
-    min_x, max_x, min_y, max_y = scale_plot_for_points(lower_points)
-    lower_envelope = visualize_convex_hull(lower_points, 'lower', min_x, max_x)
-    while not plt.waitforbuttonpress(): pass
-
-    # Merge halfplanes and display final solution
-    display_merge_halfplanes(upper_envelope, lower_envelope)
-    while not plt.waitforbuttonpress(): pass
-
-####################################
-########  Handle input  ############
-####################################
-
-input_points = []
-def handle_mouse_click(event):
-    global input_points
-    x, y = event.xdata, event.ydata
-    input_points.append((x, y))
-    draw_circle(x,y)
-
-def get_input_points():
-    global input_points
-    cid = fig.canvas.mpl_connect('button_press_event', handle_mouse_click)
-    
-    # Pause until a key is pressed (ie. the input phase has finished) 
-    while not plt.waitforbuttonpress():
-        continue
-    fig.canvas.mpl_disconnect(cid)
-    input_points = list(set(input_points))
-    return input_points
-
-###########################################
-#####  Main methods for visualization  ####
-###########################################
-
-'''
-Main method to visualize the sweepline algorithm and the primal interpretation
-Input:
-- points: list of (x, y)
-- hull_typ: 'upper' or 'lower'
-- min_x: float, the x-coordinate where the sweepline starts
-- max_x: float, the x-coordinate where the sweepline ends
-Returns:
-- halfplane_intersection: list of (x, y) intersection points defining the envelope
-                          in clockwise order -  ie. sorted by increasing x-coordinate
-                          for 'lower' and decreasing x-coordinate for 'upper'
-'''
-def visualize_convex_hull(points, hull_type, min_x, max_x):
-    points.sort(key = lambda point: point[0])
-    draw_points(points)
-    state = None
-    halfplane_intersection = None
-    display_circle_intersection([])
-    emph_lines_plt.set_data([], [])
-
-    sweepline.set_data([min_x, min_x], [0, 1])
-    while not plt.waitforbuttonpress(): pass
-
-    num_intervals = 100
-    intervals = np.arange(min_x, max_x, (max_x-min_x)/num_intervals)
-
-    # Sweepline animation
-    curr_index = 0
-    for x in intervals:
-        sweepline.set_data([x, x], [0, 1])
-        if curr_index < len(points) and x > points[curr_index][0]:
-            state = convex_hull_step(points, hull_type, state)
-            hull, _, _ = state
-            curr_index += 1
-
-            # Update convex hull subplot
-            point_sizes = [70 if i < curr_index else 30 for i in range(len(points))]
-            points_plt.set_sizes(point_sizes)
-            draw_lines(hull)
-
-            # Update halfplane subplot
-            halfplane_intersection = display_halfplane_envelope(hull, hull_type)
-
-            # Update circle subplot
-            color = 'b' if hull_type == 'upper' else 'r'
-            display_circle_intersection(halfplane_intersection, color)
-        plt.pause(0.005)
-    return halfplane_intersection
-    
-'''
-Displays the interpretation of the convex hull as a halfplane intersection region
-Input:
-- convex_hull_points: list of (x, y) points
-- hull_type: 'upper' or 'lower'
-Returns:
-- intersection_points: list of (x, y) defining the intersection region in clockwise order
 '''
-def display_halfplane_envelope(convex_hull_points, hull_type):
-    intersection_points = halfplane_envelope(convex_hull_points, hull_type)
-
-    x_points, y_points = zip(*intersection_points)
-    color = 'b' if hull_type == 'upper' else 'r'
-    emph_lines_plt.set_color(color)
-    emph_lines_plt.set_data(x_points, y_points)
-    return intersection_points
-
-'''
-Displays the interpretation of the intersection of halfplanes as an intersection of disks
-Input:
-- halfplane_intersection: list of (x, y) defining the intersection region in clockwise order
-- color: string representing a matplotlib color
-Returns: None
-'''
-def display_circle_intersection(halfplane_intersection, color = 'b'):
-    global arc_patches
-    for arc in arc_patches:
-        arc.remove()
-    arc_patches = []
-
-    if len(halfplane_intersection) == 0: return
-    new_arcs = disk_intersection(halfplane_intersection)
-    for (x, y, r, theta1, theta2) in new_arcs:
-        new_arc = matplotlib.patches.Arc((x, y), 2*r, 2*r, theta1 = theta1, theta2 = theta2, fill = False, ec = color, lw = 3)
-        circle_ax.add_patch(new_arc)
-        arc_patches.append(new_arc)
-
-'''
-Merges halfplanes and displays the final intersection region 
-Input:
-- upper_envelope: list of (x, y) intersection points defining the envelope in clockwise order
-- lower_envelope: list of (x, y) intersection points defining the envelope in clockwise order
+Visualization
+    The interactive demo: input circles, their dual halfplanes and the dual points
+    with their hulls side by side in one figure
+    The figure is only built when an instance is created
+Usage:
+  Visualization().run() shows the figure and runs the demo until the last key press
 '''
-def display_merge_halfplanes(upper_envelope, lower_envelope):
-    emph_lines_plt.set_data([], [])
-    display_circle_intersection([])
-    
-    edges = merge_halfplanes(upper_envelope, lower_envelope)
-    if len(edges) == 0: return
-    x, y = zip(*edges)
-    halfplane_ax.plot(x, y, c = 'g', lw = 3)
-
-    display_circle_intersection(edges, 'g')
-
-
+class Visualization:
+    ########################################
+    ######## Set up visualization ##########
+    ########################################
+
+    def __init__(self):
+        _import_matplotlib()
+        plt.ion()
+        self.fig, (self.circle_ax, self.halfplane_ax, self.hull_ax) = plt.subplots(nrows = 1, ncols = 3, figsize = (14,4))
+        self.circle_ax.xaxis.set_visible(False)
+        self.circle_ax.yaxis.set_visible(False)
+        self.halfplane_ax.xaxis.set_visible(False)
+        self.halfplane_ax.yaxis.set_visible(False)
+        self.hull_ax.xaxis.set_visible(False)
+        self.hull_ax.yaxis.set_visible(False)
+
+        # Set up circle image
+        self.circle_ax.set_xlim(-3, 3)
+        self.circle_ax.set_ylim(-3, 3)
+        self.circle_ax.scatter([0], [0])
+        self.circles_plt = self.circle_ax.add_collection(matplotlib.collections.EllipseCollection(
+            [], [], [], units = 'xy', offsets = np.empty((0, 2)), offset_transform = self.circle_ax.transData,
+            facecolors = 'none', edgecolors = 'k'))
+        self.arc_patches = [] # (point1, point2, color, patch) for each displayed envelope segment
+        self.arc_plt = self.circle_ax.add_collection(matplotlib.collections.PatchCollection([]))
+
+        # Set up halfplane image
+        self.halfplane_ax.set_xlim(-3, 3)
+        self.halfplane_ax.set_ylim(-3, 3)
+        self.halfplane_fill_plt = self.halfplane_ax.add_collection(matplotlib.collections.PolyCollection([], alpha = 0.05, edgecolors = 'none'))
+        self.halfplane_lines_plt = self.halfplane_ax.add_collection(matplotlib.collections.LineCollection([]))
+        self.emph_lines_plt, = self.halfplane_ax.plot([], [], c = 'b', lw = 3, zorder = 3)
+
+        # Set up hull image
+        self.hull_ax.set_xlim(-3, 3)
+        self.hull_ax.set_ylim(-3, 3)
+
+        self.points_plt = self.hull_ax.scatter([], [])
+        self.hull_plt, = self.hull_ax.plot([], [])
+        self.sweepline = self.hull_ax.axvline(ymax = 0) # Line starts invisible
+
+        self.input_points = []
+        self.renderer = BlitRenderer(self.fig, [self.sweepline, self.hull_plt, self.points_plt, self.emph_lines_plt])
+
+    ########################################
+    #############  Main method  ############
+    ########################################
+
+    '''
+    Runs the interactive demo: collects the input disks, then steps through
+    the sweeps and the merge, waiting for a key press between stages
+    '''
+    def run(self):
+        # Draw initial circles
+        center_points = self.get_input_points()
+
+        # Draw initial halfplane lines
+        lines = duality1_circlesToLines(center_points)
+        min_x, max_x, min_y, max_y = self.scale_plot_for_line_intersections(lines)
+        self.draw_halfplanes(lines, min_x, max_x, min_y, max_y)
+
+        # Calculate upper hull = upper envelope
+        upper_points = [tuple(point) for point in sort_for_hull(duality2_linesToPoints(lines[lines['orientation'] == 1]), 'upper').tolist()]
+        min_x, max_x, min_y, max_y = self.scale_plot_for_points(upper_points)
+        self.draw_points(upper_points)
+        upper_envelope = self.visualize_convex_hull(upper_points, 'upper', min_x, max_x)
+        self.draw_lines([])
+        self.draw_points([])
+
+        # Calculate lower hull = lower envelope
+        lower_points = [tuple(point) for point in sort_for_hull(duality2_linesToPoints(lines[lines['orientation'] == -1]), 'lower').tolist()]
+        min_x, max_x, min_y, max_y = self.scale_plot_for_points(lower_points)
+        lower_envelope = self.visualize_convex_hull(lower_points, 'lower', min_x, max_x)
+
+        # Merge halfplanes and display final solution
+        self.display_merge_halfplanes(upper_envelope, lower_envelope, vertical_bounds(lines))
+        while not plt.waitforbuttonpress(): pass
+
+    ####################################
+    ########  Handle input  ############
+    ####################################
+
+    def handle_mouse_click(self, event):
+        x, y = event.xdata, event.ydata
+        self.input_points.append((x, y))
+        self.draw_circles(self.input_points)
+
+    def get_input_points(self):
+        cid = self.fig.canvas.mpl_connect('button_press_event', self.handle_mouse_click)
+        
+        # Pause until a key is pressed (ie. the input phase has finished) 
+        while not plt.waitforbuttonpress():
+            continue
+        self.fig.canvas.mpl_disconnect(cid)
+        self.input_points = list(set(self.input_points))
+        return self.input_points
+
+    ###########################################
+    #####  Main methods for visualization  ####
+    ###########################################
+
+    '''
+    Main method to visualize the sweepline algorithm and the primal interpretation
+    Input:
+    - points: list of (x, y)
+    - hull_typ: 'upper' or 'lower'
+    - min_x: float, the x-coordinate where the sweepline starts
+    - max_x: float, the x-coordinate where the sweepline ends
+    Returns:
+    - halfplane_intersection: list of (x, y) intersection points defining the envelope
+                              in clockwise order -  ie. sorted by increasing x-coordinate
+                              for 'lower' and decreasing x-coordinate for 'upper'
+    '''
+    def visualize_convex_hull(self, points, hull_type, min_x, max_x):
+        points.sort(key = lambda point: point[0])
+        self.draw_points(points)
+        cursor = record_trace(points, hull_type).cursor()
+        envelope = IncrementalEnvelope(hull_type)
+        self.display_circle_intersection([])
+        self.emph_lines_plt.set_data([], [])
+
+        self.sweepline.set_data([min_x, min_x], [0, 1])
+        while not plt.waitforbuttonpress(): pass
+
+        # Sweepline animation
+        scheduler = SweepScheduler(self.renderer, [point[0] for point in points], min_x, max_x)
+        for x, num_ready in scheduler.frames():
+            self.sweepline.set_data([x, x], [0, 1])
+            if num_ready > cursor.step_num:
+                self.display_sweep_step(cursor, envelope, num_ready)
+            scheduler.wait_for_next_frame()
+
+        self.scrub_sweep(cursor, envelope, min_x, max_x)
+        if len(envelope) == 0: return None
+        return list(envelope.vertices)
+
+    '''
+    Lets the user step the finished sweep backward and forward with the arrow keys,
+    replaying the recorded trace, until any other key is pressed
+    The sweep is left at its final state
+    Input:
+    - cursor: TraceCursor of the sweep
+    - envelope: IncrementalEnvelope kept in step with the cursor
+    - min_x, max_x: float, the x-coordinates where the sweepline starts and ends
+    '''
+    def scrub_sweep(self, cursor, envelope, min_x, max_x):
+        keys = []
+        cid = self.fig.canvas.mpl_connect('key_press_event', lambda event: keys.append(event.key))
+        while True:
+            while not plt.waitforbuttonpress(): pass
+            key = keys[-1] if len(keys) > 0 else None
+            keys.clear()
+            if key not in ('left', 'right'): break
+
+            step = cursor.step_num + (1 if key == 'right' else -1)
+            if 0 <= step <= len(cursor.trace):
+                x = cursor.trace.points[step - 1][0] if step > 0 else min_x
+                self.sweepline.set_data([x, x], [0, 1])
+                self.display_sweep_step(cursor, envelope, step)
+                self.renderer.update()
+        self.fig.canvas.mpl_disconnect(cid)
+
+        if not cursor.done:
+            self.sweepline.set_data([max_x, max_x], [0, 1])
+            self.display_sweep_step(cursor, envelope, len(cursor.trace))
+            self.renderer.update()
+
+    '''
+    Moves the sweep to 'step' and updates all three subplots
+    Input:
+    - cursor: TraceCursor of the sweep
+    - envelope: IncrementalEnvelope kept in step with the cursor
+    - step: int, the number of points processed
+    Returns:
+    - halfplane_intersection: as display_halfplane_envelope, or None before the first point
+    '''
+    def display_sweep_step(self, cursor, envelope, step):
+        hull, _, _ = cursor.seek(step)
+
+        # Update convex hull subplot
+        self.points_plt.set_sizes(np.where(np.arange(len(cursor.trace)) < step, 70, 30))
+        self.draw_lines(hull)
+
+        # Update halfplane subplot
+        envelope.update(hull)
+        if len(envelope) == 0:
+            self.emph_lines_plt.set_data([], [])
+            self.display_circle_intersection([])
+            return None
+        halfplane_intersection = self.display_halfplane_envelope(envelope)
+
+        # Update circle subplot
+        color = 'b' if envelope.hull_type == 'upper' else 'r'
+        self.display_circle_intersection(halfplane_intersection, color)
+        return halfplane_intersection
+        
+    '''
+    Displays the interpretation of the convex hull as a halfplane intersection region
+    Input:
+    - envelope: IncrementalEnvelope kept in step with the convex hull
+    Returns:
+    - intersection_points: list of (x, y) defining the intersection region in clockwise order
+    '''
+    def display_halfplane_envelope(self, envelope):
+        intersection_points = envelope.vertices
+
+        x_points, y_points = zip(*intersection_points)
+        color = 'b' if envelope.hull_type == 'upper' else 'r'
+        self.emph_lines_plt.set_color(color)
+        self.emph_lines_plt.set_data(x_points, y_points)
+        return intersection_points
+
+    '''
+    Displays the interpretation of the intersection of halfplanes as an intersection of disks
+    Input:
+    - halfplane_intersection: list of (x, y) defining the intersection region in clockwise order
+    - color: string representing a matplotlib color
+    Returns: None
+    Note:
+      One arc patch is kept per envelope segment. Between sweep steps the envelope only
+      changes at its tail, so the patches of unchanged segments are kept as they are and
+      only the arcs of new segments are computed and drawn
+    '''
+    def display_circle_intersection(self, halfplane_intersection, color = 'b'):
+        num_segments = max(len(halfplane_intersection) - 1, 0)
+
+        # Find the longest prefix of segments that already have an arc in this color
+        keep = min(len(self.arc_patches), num_segments)
+        while keep > 0:
+            point1, point2, arc_color, _ = self.arc_patches[keep - 1]
+            if (arc_color == color and point1 == tuple(halfplane_intersection[keep - 1])
+                    and point2 == tuple(halfplane_intersection[keep])):
+                break
+            keep -= 1
+
+        for _, _, _, arc in self.arc_patches[keep:]:
+            if arc is None: continue
+            self.renderer.remove_artist(arc)
+            arc.remove()
+        del self.arc_patches[keep:]
+
+        if num_segments == keep: return
+        new_points = [tuple(point) for point in halfplane_intersection[keep:]]
+        new_arcs = iter(disk_intersection(new_points))
+        negligible = negligible_segments(new_points[:-1], new_points[1:])
+        profile_count('display_circle_intersection.arcs', num_segments - keep)
+        for i in range(len(new_points) - 1):
+            # disk_intersection gives no arc for a negligible (zero-length) segment
+            new_arc = None
+            if not negligible[i]:
+                x, y, r, theta1, theta2 = next(new_arcs)
+                new_arc = matplotlib.patches.Arc((x, y), 2*r, 2*r, theta1 = theta1, theta2 = theta2, fill = False, ec = color, lw = 3)
+                self.circle_ax.add_patch(new_arc)
+                self.renderer.add_artist(new_arc)
+            self.arc_patches.append((new_points[i], new_points[i + 1], color, new_arc))
+
+    '''
+    Merges halfplanes and displays the final intersection region 
+    Input:
+    - upper_envelope: list of (x, y) intersection points defining the envelope in clockwise order
+    - lower_envelope: list of (x, y) intersection points defining the envelope in clockwise order
+    - x_bounds: (lower, upper) bounds from vertical dual lines, as returned by vertical_bounds
+    '''
+    def display_merge_halfplanes(self, upper_envelope, lower_envelope, x_bounds = (-np.inf, np.inf)):
+        self.emph_lines_plt.set_data([], [])
+        self.display_circle_intersection([])
+        
+        if upper_envelope is None and lower_envelope is None:
+            edges = clip_halfplanes(None, x_bounds)
+        else:
+            edges = merge_halfplanes(upper_envelope, lower_envelope)
+            if len(edges) > 0: edges = clip_halfplanes(edges, x_bounds)
+        if len(edges) == 0: return
+        self.halfplane_ax.plot(edges.x, edges.y, c = 'g', lw = 3)
+        self.renderer.invalidate()
+
+        self.display_circle_intersection(edges, 'g')
+        self.renderer.update()
+
+    #############################################
+    #####  Helper methods for visualization  ####
+    #############################################
+
+    '''
+    Rescale halfplane axis to show all intersections
+    '''
+    def scale_plot_for_line_intersections(self, halfplanes):
+        bounds = arrangement_bounds(halfplanes) if len(halfplanes) >= 2 else None
+        # Corners (min_x, min_y) and (max_x, max_y) of the bounding box of the line intersections
+        min_x, max_x, min_y, max_y = padded_limits(None if bounds is None else np.array([bounds[0::2], bounds[1::2]]))
+        self.halfplane_ax.set_xlim(min_x, max_x)
+        self.halfplane_ax.set_ylim(min_y, max_y)
+        self.renderer.invalidate()
+        return min_x, max_x, min_y, max_y
+
+    '''
+    Rescale convex hull axis to show all intersections
+    '''
+    def scale_plot_for_points(self, points):
+        min_x, max_x, min_y, max_y = padded_limits(np.asarray(points, dtype = np.float64).reshape(-1, 2))
+        self.hull_ax.set_xlim(min_x, max_x)
+        self.hull_ax.set_ylim(min_y, max_y)
+        self.renderer.invalidate()
+        return min_x, max_x, min_y, max_y
+
+    '''
+    Display points on convex hull axis
+    '''
+    def draw_points(self, points):
+        points_x = [point[0] for point in points]
+        points_y = [point[1] for point in points]
+        self.points_plt.set_offsets(np.c_[points_x, points_y])
+        self.points_plt.set_sizes([30 for _ in points])
+        self.renderer.update()
+
+    '''
+    Display lines on convex hull axis
+    The input is a list of points (x, y)
+    '''
+    def draw_lines(self, hull):
+        if len(hull) == 0: x, y = [], []
+        else: x, y = zip(*hull)
+        self.hull_plt.set_data(x, y)
+
+    '''
+    Display the input circles, each through the origin, on the circle axis
+    All circles are one EllipseCollection that is updated in place
+    Input:
+    - centers: array-like of shape (N, 2) of circle centers
+    '''
+    def draw_circles(self, centers):
+        centers = np.asarray(centers, dtype = np.float64).reshape(-1, 2)
+        diameters = 2 * np.hypot(centers[:, 0], centers[:, 1])
+        self.circles_plt.set_offsets(centers)
+        self.circles_plt.set_widths(diameters)
+        self.circles_plt.set_heights(diameters)
+        self.circles_plt.set_angles(np.zeros(len(centers)))
+        self.renderer.invalidate()
+
+    '''
+    Display the dual lines and shade their halfplanes on the halfplane axis
+    All lines are one LineCollection and all shaded regions one PolyCollection,
+    both updated in place
+    Input:
+    - lines: LineSet (or structured array with dtype LINE_DTYPE) of lines
+    - min_x, max_x, min_y, max_y: the visible region of the halfplane axis
+    Vertical lines (orientation 0) are drawn in black, shaded on the side of their halfplane
+    '''
+    def draw_halfplanes(self, lines, min_x, max_x, min_y, max_y):
+        segments, regions, colors = halfplane_polygons(lines, (min_x, max_x, min_y, max_y))
+        self.halfplane_lines_plt.set_segments(segments)
+        self.halfplane_lines_plt.set_colors(colors)
+        self.halfplane_fill_plt.set_verts(regions)
+        self.halfplane_fill_plt.set_facecolors(colors)
+        self.renderer.invalidate()
 
 #############################################
-#####  Helper methods for visualization  ####
+########  Rendering and frame timing  #######
 #############################################
 
 '''
-Rescale halfplane axis to show all intersections
+BlitRenderer
+    Redraws only the animated artists of the figure, on top of a cached image of
+    everything else (axes, input circles, the shaded halfplanes)
+Input:
+- fig: the matplotlib figure
+- artists: the artists that change from frame to frame
+Usage:
+  add_artist(artist) / remove_artist(artist) register or unregister an animated artist
+  invalidate() must be called after anything static changes (new artists, axis limits),
+  so that the cached background is redrawn at the next update()
+  update() draws a frame and refreshes the frames-per-second readout
+  On canvases that cannot blit, the artists are left as ordinary artists and each
+  update() redraws the whole figure
 '''
-def scale_plot_for_line_intersections(halfplanes):
-    if len(halfplanes) == 1:
-        min_x = -1
-        max_x = 1
-        min_y = -1
-        max_y = 1
-    else:
-        lines = [(m,b) for (m, b, orientation) in halfplanes]
-        intersections = intersection_points(lines)
-        x_list = [x for (x,y) in intersections]
-        y_list = [y for (x,y) in intersections]
-
-        min_x = min(x_list)
-        max_x = max(x_list)
-        min_y = min(y_list)
-        max_y = max(y_list)
-        
-        x_buffer = 0.2 * abs(max_x - min_x) + 1
-        y_buffer = 0.2 * abs(max_y - min_y) + 1
-        min_x = min_x - x_buffer
-        max_x = max_x + x_buffer
-        min_y = min_y - y_buffer
-        max_y = max_y + y_buffer
-
-    halfplane_ax.set_xlim(min_x, max_x)
-    halfplane_ax.set_ylim(min_y, max_y)
-    return min_x, max_x, min_y, max_y
+class BlitRenderer:
+    def __init__(self, fig, artists):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self._artists = []
+        self._backgrounds = None
+        self._last_frame_time = None
+        self._fps = None
+
+        self.fps_text = fig.axes[-1].text(0.98, 0.02, '', transform = fig.axes[-1].transAxes,
+                                          ha = 'right', va = 'bottom', fontsize = 8)
+        for artist in [*artists, self.fps_text]:
+            self.add_artist(artist)
+        if self.canvas.supports_blit:
+            self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add_artist(self, artist):
+        # Animated artists are skipped by a full draw, so only blitting may draw them
+        artist.set_animated(self.canvas.supports_blit)
+        self._artists.append(artist)
+
+    def remove_artist(self, artist):
+        self._artists.remove(artist)
+
+    def invalidate(self):
+        self._backgrounds = None
+
+    def update(self):
+        self._update_fps()
+        if not self.canvas.supports_blit:
+            self.canvas.draw_idle()
+            return
+
+        if self._backgrounds is None:
+            # A full draw caches the background and draws the animated artists (see _on_draw)
+            self.canvas.draw()
+        else:
+            for ax, background in self._backgrounds:
+                self.canvas.restore_region(background)
+            self._draw_animated()
+        self.canvas.flush_events()
+
+    def _on_draw(self, event):
+        self._backgrounds = [(ax, self.canvas.copy_from_bbox(ax.bbox)) for ax in self.fig.axes]
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self._artists:
+            artist.axes.draw_artist(artist)
+        for ax in self.fig.axes:
+            self.canvas.blit(ax.bbox)
+
+    def _update_fps(self):
+        now = time.perf_counter()
+        if self._last_frame_time is not None and now > self._last_frame_time:
+            fps = 1/(now - self._last_frame_time)
+            self._fps = fps if self._fps is None else 0.9 * self._fps + 0.1 * fps
+            self.fps_text.set_text('%.0f fps' % self._fps)
+        self._last_frame_time = now
 
 '''
-Rescale convex hull axis to show all intersections
+SweepScheduler
+    Decides when to draw the frames of the sweepline animation
+    Frames are keyed on the sorted x-coordinates of the points: the sweepline jumps
+    straight to the next point instead of drawing empty frames, and all points within
+    (max_x - min_x)/max_frames of each other are processed together in one frame,
+    so the animation takes at most max_frames frames however many points there are
+Input:
+- renderer: BlitRenderer that draws each frame
+- xs: sorted x-coordinates of the points
+- min_x: float, the x-coordinate where the sweepline starts
+- max_x: float, the x-coordinate where the sweepline ends
+- max_frames: int, the most frames to draw for the whole sweep
+- target_fps: float, the rate at which frames are shown
+Usage:
+  frames() yields (sweep_x, num_ready), where num_ready is how many points lie
+  at or left of the sweepline
+  wait_for_next_frame() shows the frame, waiting only as long as the frame rate needs
 '''
-def scale_plot_for_points(points):
-    if len(points) == 0:
-        min_x = -1
-        max_x = 1
-        min_y = -1
-        max_y = 1
-    else:
-        min_x = min(points, key = lambda point: point[0])[0]
-        max_x = max(points, key = lambda point: point[0])[0]
-        min_y = min(points, key = lambda point: point[1])[1]
-        max_y = max(points, key = lambda point: point[1])[1]
-
-        x_buffer = 0.2 * abs(max_x - min_x) + 1
-        y_buffer = 0.2 * abs(max_y - min_y) + 1
-        min_x = min_x - x_buffer
-        max_x = max_x + x_buffer
-        min_y = min_y - y_buffer
-        max_y = max_y + y_buffer
-
-    hull_ax.set_xlim(min_x, max_x)
-    hull_ax.set_ylim(min_y, max_y)
-    return min_x, max_x, min_y, max_y
+class SweepScheduler:
+    def __init__(self, renderer, xs, min_x, max_x, max_frames = 100, target_fps = 30):
+        self.renderer = renderer
+        self.xs = xs
+        self.min_x, self.max_x = min_x, max_x
+        self.max_frames = max_frames
+        self.frame_time = 1/target_fps
+        self._next_frame_time = None
+
+    def frames(self):
+        return sweep_frames(self.xs, self.min_x, self.max_x, self.max_frames)
+
+    def wait_for_next_frame(self):
+        now = time.perf_counter()
+        if self._next_frame_time is None:
+            self._next_frame_time = now
+
+        self.renderer.update()
+        remaining = self._next_frame_time - now
+        if remaining > 0:
+            self.renderer.canvas.start_event_loop(remaining)
+        else:
+            # Running behind: handle pending GUI events without sleeping
+            self.renderer.canvas.flush_events()
+        self._next_frame_time = max(self._next_frame_time, now) + self.frame_time
+
+########################################################
+#####  Plot geometry (shared with export_animation) ####
+########################################################
+
+# RGBA colors of the halfplanes of upper, lower and vertical lines ('b', 'r' and 'k')
+UPPER_COLOR = (0.0, 0.0, 1.0, 1.0)
+LOWER_COLOR = (1.0, 0.0, 0.0, 1.0)
+VERTICAL_COLOR = (0.0, 0.0, 0.0, 1.0)
 
 '''
-Display points on convex hull axis
+Yields the frames of a sweep over sorted x-coordinates, as (sweep_x, num_ready)
+where num_ready is how many points lie at or left of the sweepline
+The sweepline jumps straight to the next point, and all points within
+(max_x - min_x)/max_frames of each other are processed together in one frame
+Input:
+- xs: sorted x-coordinates of the points
+- min_x, max_x: float, the x-coordinates where the sweepline starts and ends
+- max_frames: int, the most frames to draw for the whole sweep
 '''
-def draw_points(points):
-    points_x = [point[0] for point in points]
-    points_y = [point[1] for point in points]
-    points_plt.set_offsets(np.c_[points_x, points_y])
-    points_plt.set_sizes([30 for _ in points])
-    plt.draw()
-    plt.pause(.1)
+def sweep_frames(xs, min_x, max_x, max_frames):
+    frame_gap = (max_x - min_x)/max_frames
+    x, num_ready = min_x, 0
+    while num_ready < len(xs):
+        x = max(x + frame_gap, xs[num_ready])
+        num_ready = bisect.bisect_right(xs, x, lo = num_ready)
+        yield x, num_ready
+    if x < max_x:
+        yield max_x, num_ready
 
 '''
-Display lines on convex hull axis
-The input is a list of points (x, y)
+Limits of an axis showing all of 'points', padded by a fifth of their extent plus one
+Input: array of shape (N, 2) of points, or None
+Returns: (min_x, max_x, min_y, max_y), or (-1, 1, -1, 1) if there are no points
 '''
-def draw_lines(hull):
-    if len(hull) == 0: x, y = [], []
-    else: x, y = zip(*hull)
-    hull_plt.set_data(x, y)
+def padded_limits(points):
+    if points is None or len(points) == 0:
+        return (-1, 1, -1, 1)
+    min_x, min_y = points.min(axis = 0).tolist()
+    max_x, max_y = points.max(axis = 0).tolist()
+    x_buffer = 0.2 * abs(max_x - min_x) + 1
+    y_buffer = 0.2 * abs(max_y - min_y) + 1
+    return (min_x - x_buffer, max_x + x_buffer, min_y - y_buffer, max_y + y_buffer)
 
 '''
-Display a circle on the convex hull
+The dual lines clipped to an axis, and the regions of their halfplanes within it
+Input:
+- lines: LineSet (or structured array with dtype LINE_DTYPE) of lines
+- limits: (min_x, max_x, min_y, max_y), the visible region of the axis
+Returns: (segments, regions, colors) where
+- segments: array of shape (N, 2, 2), the ends of each line
+- regions: array of shape (N, 4, 2), the corners of each shaded halfplane
+- colors: array of shape (N, 4), the RGBA color of each line
+Vertical lines (orientation 0) run bottom to top and are shaded towards x >= c if c > 0
 '''
-def draw_circle(x, y):
-    r = math.sqrt(x ** 2 + y ** 2)
-    circle = plt.Circle((x,y), r, fill = False)
-    circle_ax.add_artist(circle)
-
-
-# Call main method
-main()
+def halfplane_polygons(lines, limits):
+    min_x, max_x, min_y, max_y = limits
+    slopes, intercepts = lines['slope'], lines['intercept']
+    upper = lines['orientation'] == 1
+    vertical = lines['orientation'] == 0
+
+    segments = np.empty((len(lines), 2, 2))
+    segments[:, :, 0] = [min_x, max_x]
+    with np.errstate(invalid = 'ignore'):
+        segments[:, :, 1] = slopes[:, None] * segments[:, :, 0] + intercepts[:, None]
+
+    regions = np.empty((len(lines), 4, 2))
+    regions[:, :2] = segments
+    regions[:, 2:, 0] = [max_x, min_x]
+    regions[:, 2:, 1] = np.where(upper, max_y, min_y)[:, None]
+
+    c = np.clip(intercepts[vertical], min_x, max_x)
+    segments[vertical, :, 0] = c[:, None]
+    segments[vertical, :, 1] = [min_y, max_y]
+    regions[vertical, :2] = segments[vertical]
+    regions[vertical, 2:, 0] = np.where(intercepts[vertical] > 0, max_x, min_x)[:, None]
+    regions[vertical, 2:, 1] = [max_y, min_y]
+
+    colors = np.where(upper[:, None], UPPER_COLOR, LOWER_COLOR)
+    colors[vertical] = VERTICAL_COLOR
+    return segments, regions, colors
+
+if __name__ == '__main__':
+    Visualization().run()